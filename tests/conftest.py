@@ -0,0 +1,60 @@
+import sys
+import zlib
+from array import array
+from types import ModuleType, SimpleNamespace
+
+import pytest
+
+from ub.word_index import WordIndex, SOURCE_WORDFREQ
+
+
+def build_index(words, language="en"):
+    """Small WordIndex over words (in wordfreq order), without the corpora."""
+    index = WordIndex(language)
+    grouped = {}
+    for rank, word in enumerate(words):
+        word_id = index._add_word(word, 1.0 / (rank + 1))
+        grouped.setdefault(word[0], []).append(word_id)
+    for letter, word_ids in grouped.items():
+        index._add_group(SOURCE_WORDFREQ, letter, word_ids)
+    index.sorted_ids = array('I', sorted(range(len(index.words)), key=index.words.__getitem__))
+    index.fingerprint = format(zlib.crc32("\n".join(index.words).encode()), "08x")
+    return index
+
+
+@pytest.fixture
+def make_index():
+    return build_index
+
+
+@pytest.fixture
+def corpora(monkeypatch):
+    """
+    Stand-ins for the wordfreq and NLTK modules, so WordIndex.build() runs without the corpora.
+    Fill wordlists[language] (wordfreq order), frequencies[word] and nltk_words; nltk_words = None
+    makes the corpus missing.
+    """
+    state = SimpleNamespace(wordlists={}, frequencies={}, nltk_words=[])
+
+    def words():
+        if state.nltk_words is None:
+            raise LookupError("Resource words not found.")
+        return list(state.nltk_words)
+
+    def find(resource):
+        if state.nltk_words is None:
+            raise LookupError(resource)
+
+    wordfreq = ModuleType("wordfreq")
+    wordfreq.top_n_list = lambda language, n: state.wordlists.get(language, [])[:n]
+    wordfreq.word_frequency = lambda word, language: state.frequencies.get(word, 0.0)
+    wordfreq.available_languages = lambda: {language: language for language in state.wordlists}
+    nltk = ModuleType("nltk")
+    nltk.data = SimpleNamespace(find=find)
+    nltk.download = lambda resource: False  # What nltk does when offline
+    corpus = ModuleType("nltk.corpus")
+    corpus.words = SimpleNamespace(words=words)
+    nltk.corpus = corpus
+    for name, module in (("wordfreq", wordfreq), ("nltk", nltk), ("nltk.corpus", corpus)):
+        monkeypatch.setitem(sys.modules, name, module)
+    return state
@@ -0,0 +1,78 @@
+import random
+
+import numpy as np
+import pytest
+
+from ub.continuations import ContinuationTable
+from ub.used_words import UsedBitset
+from ub.word_index import WordIndex, SOURCE_NLTK, SOURCE_WORDFREQ
+
+
+@pytest.fixture
+def index(corpora):
+    rng = random.Random(3)
+    words = set()
+    while len(words) < 150:
+        words.add("".join(rng.choice("abcdz") for _ in range(rng.randint(1, 6))))
+    corpora.wordlists["en"] = sorted(words)
+    corpora.frequencies = {word: rng.choice((1e-3, 1e-4, 1e-5)) for word in words}  # Ties on frequency
+    corpora.nltk_words = ["".join(rng.choice("abcdz") for _ in range(rng.randint(1, 6))) for _ in range(80)]
+    return WordIndex.build("en")
+
+
+def random_used(index, rng, share):
+    used = UsedBitset()
+    for word_id in range(len(index)):
+        if rng.random() < share:
+            used.add_id(word_id)
+    return used
+
+
+def brute_replies(index, used, word_id, min_length):
+    """Unused words other than word_id that start with its last letter and are at least min_length long."""
+    last = index.words[word_id][-1]
+    return sum(1 for other in range(len(index))
+               if other != word_id and not used.has_id(other)
+               and index.words[other][0] == last and len(index.words[other]) >= min_length)
+
+
+def brute_best_move(index, used, source, letter, min_length):
+    entries = index.entries(source, letter) or []
+    ranked = [
+        (brute_replies(index, used, word_id, min_length),
+         index.frequencies[word_id] if source == SOURCE_WORDFREQ else 0.0, position, word_id)
+        for position, word_id in enumerate(entries)
+        if len(index.words[word_id]) >= min_length and not used.has_id(word_id)
+    ]
+    if not ranked:
+        return None
+    replies, _, _, word_id = min(ranked)
+    return word_id, replies
+
+
+def test_best_move_matches_brute_force(index):
+    table = ContinuationTable(index)
+    rng = random.Random(5)
+    for _ in range(60):
+        used = random_used(index, rng, rng.choice((0.0, 0.3, 0.8)))
+        source, letter, min_length = rng.choice((SOURCE_WORDFREQ, SOURCE_NLTK)), rng.choice("abcdz"), rng.randint(1, 7)
+        assert table.best_move(used, source, letter, min_length) == brute_best_move(index, used, source, letter, min_length)
+
+
+def test_overlay_tracks_used_words(index):
+    table = ContinuationTable(index)
+    rng = random.Random(9)
+    used = random_used(index, rng, 0.2)
+    live = table.overlay(1, used)
+    for word_id in rng.sample(range(len(index)), 40):
+        if not used.has_id(word_id):
+            table.use(1, word_id)
+            used.add_id(word_id)
+    assert np.array_equal(live, table.live_counts(used))
+    for letter in "abcdz":
+        for min_length in range(1, 8):
+            expected = sum(1 for word_id in range(len(index)) if not used.has_id(word_id)
+                           and index.words[word_id][0] == letter and len(index.words[word_id]) >= min_length)
+            assert live[table.letter_ids[letter], min_length] == expected
+    table.reset(1)
+    assert table.overlay(1, UsedBitset()) is not live
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+from pyrogram.enums import ChatType
+
+from ub.game_filter import GameFilter, REJECTION_PATTERN
+
+PROMPT = "Turn: X @ja (Next: Y)\nYour word must start with a and include at least 3 letters."
+GAME_BOT = SimpleNamespace(id=100, is_bot=True)
+OTHER_BOT = SimpleNamespace(id=200, is_bot=True)
+PERSON = SimpleNamespace(id=300, is_bot=False)
+
+
+def message(text, chat_id=1, user=GAME_BOT, chat_type=ChatType.SUPERGROUP, reply=False):
+    return SimpleNamespace(chat=SimpleNamespace(id=chat_id, type=chat_type), text=text, from_user=user,
+                           reply_to_message=SimpleNamespace(id=9) if reply else None)
+
+
+def make_filter(bot_ids=()):
+    game_filter = GameFilter(bot_ids)
+    game_filter.compile({0: [1], 1: [2]})
+    return game_filter
+
+
+def test_prompts_and_rejections_from_the_game_bot_pass():
+    game_filter = make_filter([GAME_BOT.id])
+    assert game_filter.check(0, message(PROMPT))
+    assert game_filter.check(0, message("Apple is not in my list of words.", reply=True))
+    assert not game_filter.check(0, message("Apple is not in my list of words."))  # Not a reply to us
+    assert not game_filter.check(0, message(PROMPT, user=OTHER_BOT))
+    assert not game_filter.check(0, message("hello everyone"))
+    assert (game_filter.passed, game_filter.dropped) == (2, 3)
+
+
+def test_chats_of_other_shards_and_private_chats_are_dropped():
+    game_filter = make_filter([GAME_BOT.id])
+    assert not game_filter.check(0, message(PROMPT, chat_id=2))  # Played by shard 1
+    assert game_filter.check(1, message(PROMPT, chat_id=2))
+    assert not game_filter.check(0, message(PROMPT, chat_id=3))  # Not enabled
+    assert not game_filter.check(0, message(PROMPT, chat_type=ChatType.PRIVATE))
+    assert game_filter.dropped == 1  # Only enabled chats count
+
+
+def test_game_bot_learned_from_first_prompt():
+    game_filter = make_filter()
+    assert game_filter.check(0, message(PROMPT, user=OTHER_BOT))  # Unknown yet: any sender may be the game bot
+    game_filter.learn(1, GAME_BOT)
+    assert game_filter.check(0, message(PROMPT))
+    assert not game_filter.check(0, message(PROMPT, user=OTHER_BOT))
+    game_filter.learn(1, OTHER_BOT)  # First one learned sticks
+    assert game_filter.check(0, message(PROMPT))
+
+
+def test_single_words_pass_only_while_watching():
+    game_filter = make_filter([GAME_BOT.id])
+    assert not game_filter.check(0, message("apple", user=PERSON))
+    game_filter.watch(1)
+    assert game_filter.check(0, message("apple", user=PERSON))
+    assert not game_filter.check(0, message("two words", user=PERSON))
+    assert not game_filter.check(0, message("apple", user=OTHER_BOT))
+    assert game_filter.check(0, message("नमस्ते", user=PERSON))  # Letters with combining marks
+    game_filter.unwatch(1)
+    assert not game_filter.check(0, message("apple", user=PERSON))
+
+
+def test_rejected_word_keeps_its_marks():
+    match = REJECTION_PATTERN.match("प्रधानमंत्री is not in my list of words.")
+    assert match and match.group(1) == "प्रधानमंत्री"
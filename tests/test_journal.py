@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+from ub.journal import ConfigJournal, read_config, replay_chats
+
+
+def make_journal(tmp_path, state):
+    return ConfigJournal(str(tmp_path / "config.json"), str(tmp_path / "config.journal"),
+                         lambda: state, flush_delay=0.01)
+
+
+def test_events_round_trip(tmp_path):
+    async def run():
+        journal = make_journal(tmp_path, {})
+        journal.record("enable", 1, info={"case": "1"})
+        journal.record("use", 1, word="apple")
+        await journal.flush()
+        return await make_journal(tmp_path, {}).load()
+
+    data, events = asyncio.run(run())
+    assert data == {}
+    assert events == [{"op": "enable", "chat": 1, "info": {"case": "1"}}, {"op": "use", "chat": 1, "word": "apple"}]
+
+
+def test_batched_flush_on_timer(tmp_path):
+    async def run():
+        journal = make_journal(tmp_path, {})
+        journal.record("use", 1, word="apple")
+        await asyncio.sleep(0.1)
+        return (tmp_path / "config.journal").read_text()
+
+    assert json.loads(asyncio.run(run())) == {"op": "use", "chat": 1, "word": "apple"}
+
+
+def test_compact_writes_snapshot_and_empties_journal(tmp_path):
+    state = {"enabled_chats": {"1": {"case": "2"}}}
+
+    async def run():
+        journal = make_journal(tmp_path, state)
+        journal.record("enable", 1, info={"case": "2"})
+        await journal.flush()
+        await journal.compact()
+        assert journal.journal_size == 0
+        journal.record("use", 1, word="pear")
+        await journal.flush()
+        return await make_journal(tmp_path, state).load()
+
+    data, events = asyncio.run(run())
+    assert data == state
+    assert events == [{"op": "use", "chat": 1, "word": "pear"}]
+
+
+def test_torn_line_is_skipped(tmp_path):
+    (tmp_path / "config.journal").write_text('{"op": "use", "chat": 1, "word": "a"}\n{"op": "us')
+    data, events = asyncio.run(make_journal(tmp_path, {}).load())
+    assert events == [{"op": "use", "chat": 1, "word": "a"}]
+
+
+def test_replay_chats_folds_events_over_snapshot():
+    data = {
+        "enabled_chats": {"1": {"case": "1"}, "2": {"case": "2", "language": "de"}},
+        "used_words": {"1": {"ids": "AAAA"}, "2": {"ids": "AQAA"}},
+        "used_words_index": {"en": "aaaa", "de": "bbbb"},
+        "moved_chats": {"3": {"info": {"case": "3"}, "used": None, "index": None, "words": ["fig"]}},
+    }
+    events = [{"op": "use", "chat": 1, "word": "apple"}, {"op": "clear", "chat": 2},
+              {"op": "use", "chat": 2, "word": "birne"}, {"op": "disable", "chat": 1},
+              {"op": "enable", "chat": 4, "info": {"case": "1"}}, {"op": "use", "chat": 4, "word": "kiwi"},
+              {"op": "use", "chat": 5, "word": "lost"}]
+    chats = replay_chats(data, events)
+    assert sorted(chats) == [2, 3, 4]
+    assert chats[2] == {"info": {"case": "2", "language": "de"}, "used": None, "index": None, "words": ["birne"]}
+    assert chats[3]["moved"] and chats[3]["words"] == ["fig"]
+    assert chats[4] == {"info": {"case": "1"}, "used": None, "index": None, "words": ["kiwi"]}
+    assert replay_chats({"enabled_chats": {"1": {}}, "used_words": {"1": ["a"]}, "used_words_index": "cccc"}, [])[1] == \
+        {"info": {}, "used": ["a"], "index": "cccc", "words": []}  # Saved before chats had languages
+
+
+def test_read_config_reports_markers_and_write_time(tmp_path):
+    snapshot, journal = tmp_path / "chat_config.shard1.json", tmp_path / "chat_config.shard1.journal"
+    snapshot.write_text(json.dumps({"enabled_chats": {"7": {"case": "1"}}, "imported_chats": {"7": 123.0}}))
+    journal.write_text('{"op": "use", "chat": 7, "word": "pear"}\n')
+    config = asyncio.run(read_config(str(snapshot), str(journal)))
+    assert config.chats[7]["words"] == ["pear"] and config.imported == {7: 123.0}
+    assert config.written == max(snapshot.stat().st_mtime, journal.stat().st_mtime)
+    assert asyncio.run(read_config(str(tmp_path / "missing.json"), str(tmp_path / "missing.journal"))) == (0.0, {}, {})
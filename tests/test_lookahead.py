@@ -0,0 +1,48 @@
+import random
+
+from ub.continuations import ContinuationTable
+from ub.lookahead import LookaheadEngine, WIN
+from ub.used_words import UsedBitset
+
+
+def chain_words(count, seed=1):
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice("abcdef") for _ in range(rng.randint(3, 6))))
+    return sorted(words)
+
+
+def test_timeout_still_returns_a_move(make_index):
+    index = make_index(chain_words(400))
+    engine = LookaheadEngine(ContinuationTable(index), check_every=1)
+    result = engine.search(UsedBitset(), "a", 3, budget=0.0)  # Deadline already passed when the search starts
+    assert result is not None
+    end, score, depth = result
+    assert depth >= 1  # The depth-1 pass needs no node checks, so it always completes
+    assert engine.moves(UsedBitset(), 3)[engine.table.letter_ids["a"]][engine.table.letter_ids[end]] > 0
+
+
+def test_depth_one_ranks_like_case_2(make_index):
+    index = make_index(chain_words(400, seed=2))
+    table = ContinuationTable(index)
+    engine = LookaheadEngine(table, check_every=1)
+    end, score, depth = engine.search(UsedBitset(), "b", 3, budget=0.0)
+    word_id, replies = table.best_move(UsedBitset(), "wordfreq", "b", 3)
+    assert depth == 1 or abs(score) >= WIN
+    assert table.live_counts(UsedBitset())[table.letter_ids[end], 3] - (end == "b") == replies
+
+
+def test_finds_forced_win(make_index):
+    # "ax" hands the opponent x, which no word starts with; "ab" would let them answer "ba"
+    index = make_index(["ab", "ax", "ba"])
+    engine = LookaheadEngine(ContinuationTable(index))
+    end, score, depth = engine.search(UsedBitset(), "a", 2, budget=1.0)
+    assert end == "x" and score >= WIN
+
+
+def test_no_move(make_index):
+    index = make_index(["ab", "ba"])
+    used = UsedBitset()
+    used.add_id(index.id_of("ab"))
+    assert LookaheadEngine(ContinuationTable(index)).search(used, "a", 2, budget=1.0) is None
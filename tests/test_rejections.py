@@ -0,0 +1,88 @@
+import asyncio
+
+from ub.rejections import RejectionStore
+
+WORDS = ["apple", "ant", "banana"]
+
+
+def test_exclusion_needs_two_chats(tmp_path):
+    async def run():
+        store = RejectionStore(str(tmp_path / "rejections.json"))
+        assert not store.record("apple", 1)
+        assert not store.record("apple", 1)  # Same chat again
+        assert not store.is_excluded("apple")
+        assert store.record("apple", 2)
+        assert not store.record("apple", 3)  # Already excluded
+        return store
+
+    store = asyncio.run(run())
+    assert store.is_excluded("Apple") and store.excluded_count() == 1
+
+
+def test_excluded_for_maps_ids_per_language(tmp_path, make_index):
+    indexes = {"en": make_index(WORDS), "de": make_index(["apfel", "apple"], "de")}
+
+    async def run():
+        store = RejectionStore(str(tmp_path / "rejections.json"))
+        store.bind(indexes.__getitem__)
+        store.record("apple", 1)
+        store.record("apple", 2)
+        return store
+
+    store = asyncio.run(run())
+    assert store.excluded_for("en").has_id(indexes["en"].id_of("apple"))
+    assert len(store.excluded_for("de")) == 0  # Rejected in English chats only
+    assert store.is_excluded("apple", "en") and not store.is_excluded("apple", "de")
+
+
+def test_flush_merges_other_processes(tmp_path):
+    path = str(tmp_path / "rejections.json")
+
+    async def run():
+        first, second = RejectionStore(path), RejectionStore(path)
+        first.record("apple", 1)
+        first.record("apple", 1)
+        await first.flush()
+        second.record("apple", 2, "de")
+        changed = await second.flush()
+        await first.flush()
+        return first, second, changed
+
+    first, second, changed = asyncio.run(run())
+    for store in (first, second):
+        entry = store.entries["apple"]
+        assert entry["chats"] == {"1": 2, "2": 1}  # Per-chat counts by maximum, not summed
+        assert sorted(entry["languages"]) == ["de", "en"]
+        assert store.is_excluded("apple")
+    assert changed  # The first chat, read from the file, is what excludes it for second
+
+
+def test_unban_reaches_other_processes(tmp_path):
+    path = str(tmp_path / "rejections.json")
+
+    async def run():
+        first, second = RejectionStore(path), RejectionStore(path)
+        first.record("apple", 1)
+        first.record("apple", 2)
+        await first.flush()
+        await second.load()
+        assert second.unban("apple")
+        await second.flush()
+        await first.reload()
+        return first
+
+    first = asyncio.run(run())
+    assert not first.is_excluded("apple")
+
+
+def test_old_entries_default_to_english(tmp_path):
+    (tmp_path / "rejections.json").write_text(
+        '{"apple": {"chats": {"1": 1, "2": 1}, "first": 1.0, "last": 2.0, "unbanned_at": 0.0}}')
+
+    async def run():
+        store = RejectionStore(str(tmp_path / "rejections.json"))
+        await store.load()
+        return store
+
+    store = asyncio.run(run())
+    assert store.is_excluded("apple", "en") and not store.is_excluded("apple", "de")
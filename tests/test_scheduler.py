@@ -0,0 +1,77 @@
+import asyncio
+
+from pyrogram.errors import FloodWait
+
+from ub.scheduler import SendScheduler, PRIORITY_ADMIN, PRIORITY_GAME, PRIORITY_LOG
+
+
+def recorder(fail_first=0):
+    sent = []
+    failures = [fail_first]
+
+    async def send(chat_id, text, **kwargs):
+        if failures[0]:
+            failures[0] -= 1
+            raise FloodWait(value=0)
+        sent.append((chat_id, text))
+        return text
+
+    return sent, send
+
+
+def test_priorities_go_out_in_order():
+    sent, send = recorder()
+
+    async def run():
+        scheduler = SendScheduler(send)
+        return await asyncio.gather(
+            scheduler.send(3, "log", PRIORITY_LOG),
+            scheduler.send(2, "admin", PRIORITY_ADMIN),
+            scheduler.send(1, "word", PRIORITY_GAME),
+        )
+
+    assert asyncio.run(run()) == ["log", "admin", "word"]
+    assert sent == [(1, "word"), (2, "admin"), (3, "log")]
+
+
+def test_stale_game_word_is_dropped():
+    sent, send = recorder()
+
+    async def run():
+        scheduler = SendScheduler(send, chat_rate=0.01, chat_burst=1)
+        first = await scheduler.send(1, "first", PRIORITY_GAME)
+        stale = asyncio.ensure_future(scheduler.send(1, "old", PRIORITY_GAME))  # Waits for the chat's bucket
+        await asyncio.sleep(0.01)
+        scheduler.new_prompt(1)
+        await scheduler.send(2, "wake up", PRIORITY_ADMIN)
+        return first, await stale, scheduler.dropped
+
+    first, stale, dropped = asyncio.run(run())
+    assert (first, stale, dropped) == ("first", None, 1)
+    assert (1, "old") not in sent
+
+
+def test_flood_wait_retries_and_counts():
+    sent, send = recorder(fail_first=1)
+
+    async def run():
+        scheduler = SendScheduler(send)
+        return await scheduler.send(1, "word", PRIORITY_GAME), scheduler.flood_waits
+
+    assert asyncio.run(run()) == ("word", 1)
+    assert sent == [(1, "word")]
+
+
+def test_flood_wait_gives_up_after_max_attempts():
+    sent, send = recorder(fail_first=5)
+
+    async def run():
+        scheduler = SendScheduler(send, max_attempts=2)
+        try:
+            await scheduler.send(1, "word", PRIORITY_GAME)
+        except FloodWait:
+            return scheduler.flood_waits
+        return None
+
+    assert asyncio.run(run()) == 2
+    assert sent == []
@@ -0,0 +1,121 @@
+import pytest
+
+from ub.journal import ConfigFile
+from ub.sharding import HashRing, ShardCoordinator, place_chats
+
+CHATS = [-1001000000000 - i for i in range(3000)]
+
+
+def test_single_shard_owns_everything():
+    ring = HashRing(1)
+    assert {ring.shard_for(chat_id) for chat_id in CHATS} == {0}
+
+
+def test_chats_spread_over_shards():
+    ring = HashRing(3)
+    counts = [0, 0, 0]
+    for chat_id in CHATS:
+        counts[ring.shard_for(chat_id)] += 1
+    assert all(0.2 < count / len(CHATS) < 0.47 for count in counts)
+
+
+def test_adding_a_shard_only_moves_chats_to_it():
+    before, after = HashRing(3), HashRing(4)
+    moved = 0
+    for chat_id in CHATS:
+        old, new = before.shard_for(chat_id), after.shard_for(chat_id)
+        if old != new:
+            assert new == 3
+            moved += 1
+    assert 0.1 < moved / len(CHATS) < 0.4
+
+
+def test_assignment_is_stable_across_instances():
+    assert [HashRing(4).shard_for(chat_id) for chat_id in CHATS[:50]] == \
+           [HashRing(4).shard_for(chat_id) for chat_id in CHATS[:50]]
+
+
+def test_coordinator_ownership():
+    everything = ShardCoordinator(3)
+    assert everything.runs_all and everything.is_coordinator and everything.lead == 0
+    assert all(everything.owns(chat_id) for chat_id in CHATS[:100])
+
+    part = ShardCoordinator(3, [2, 1])
+    assert part.local == [1, 2] and part.lead == 1
+    assert not part.runs_all and not part.is_coordinator
+    for chat_id in CHATS[:100]:
+        assert part.owns(chat_id) == (part.shard_for(chat_id) in (1, 2))
+
+
+@pytest.mark.parametrize("local", [[], [3], [-1]])
+def test_coordinator_rejects_unknown_shards(local):
+    with pytest.raises(ValueError):
+        ShardCoordinator(3, local)
+
+
+def chat_moving(before, after, old, new):
+    return next(chat_id for chat_id in CHATS if before.shard_for(chat_id) == old and after.shard_for(chat_id) == new)
+
+
+def record(name, words=(), moved=False):
+    saved = {"info": {"name": name}, "used": None, "index": None, "words": list(words)}
+    return dict(saved, moved=True) if moved else saved
+
+
+def test_moved_chat_is_kept_then_taken_over():
+    chat_id = chat_moving(HashRing(2), HashRing(3), 0, 2)
+    stays = next(chat_id for chat_id in CHATS if HashRing(3).shard_for(chat_id) == 0)
+    files = {"chat_config.json": ConfigFile(100.0, {chat_id: record("moving", ["apple"]), stays: record("staying")}, {})}
+
+    chats, moved, _ = place_chats(ShardCoordinator(3, [0]), files, {"chat_config.json": 0})
+    assert list(chats) == [stays] and list(moved[0]) == [chat_id]
+
+    chats, moved, _ = place_chats(ShardCoordinator(3, [2]), files, {"chat_config.shard2.json": 2})
+    assert chats == {chat_id: (2, files["chat_config.json"].chats[chat_id], "chat_config.json")}
+    assert moved == {2: {}}
+
+
+def test_import_marker_stops_stale_copies():
+    chat_id = chat_moving(HashRing(2), HashRing(3), 1, 2)
+    files = {
+        "chat_config.shard1.json": ConfigFile(100.0, {chat_id: record("moving", moved=True)}, {}),
+        "chat_config.shard2.json": ConfigFile(200.0, {}, {chat_id: 150.0}),  # Taken over, then disabled
+    }
+    chats, moved, _ = place_chats(ShardCoordinator(3, [2]), files, {"chat_config.shard2.json": 2})
+    assert chats == {}
+    chats, moved, _ = place_chats(ShardCoordinator(3, [1]), files, {"chat_config.shard1.json": 1})
+    assert moved == {1: {}}  # Its new shard has it
+
+
+def test_newest_file_wins_unless_taken_over_since():
+    chat_id = next(chat_id for chat_id in CHATS if HashRing(2).shard_for(chat_id) == 1)
+    own = {"chat_config.shard1.json": 1}
+    files = {
+        "chat_config.json": ConfigFile(300.0, {chat_id: record("newer")}, {}),
+        "chat_config.shard1.json": ConfigFile(100.0, {}, {}),
+        "chat_config.shard0-1.json": ConfigFile(50.0, {chat_id: record("older")}, {}),  # Left from a label-named layout
+    }
+    chats, _, _ = place_chats(ShardCoordinator(2, [1]), files, own)
+    assert chats[chat_id][1]["info"]["name"] == "newer"
+
+    # Shard 0 took the chat over after the old file was written: that copy is out of date
+    files["chat_config.json"] = ConfigFile(300.0, {}, {chat_id: 200.0})
+    files["chat_config.shard1.json"] = ConfigFile(100.0, {chat_id: record("orphaned")}, {})
+    chats, _, _ = place_chats(ShardCoordinator(2, [1]), files, own)
+    assert chats == {}
+
+
+def test_own_marker_superseded_by_a_later_takeover():
+    # Shard 1 took the chat over, the fleet shrank to one shard (which took it back), then grew again
+    chat_id = next(chat_id for chat_id in CHATS if HashRing(2).shard_for(chat_id) == 1)
+    files = {
+        "chat_config.json": ConfigFile(300.0, {chat_id: record("current", ["pear"])}, {chat_id: 250.0}),
+        "chat_config.shard1.json": ConfigFile(100.0, {chat_id: record("orphaned")}, {chat_id: 90.0}),
+    }
+    chats, moved, imported = place_chats(ShardCoordinator(2, [1]), files, {"chat_config.shard1.json": 1})
+    assert chats[chat_id] == (1, files["chat_config.json"].chats[chat_id], "chat_config.json")
+    assert imported == {1: {}}
+
+    files["chat_config.shard1.json"] = ConfigFile(400.0, {}, {chat_id: 350.0})  # Taken back, then disabled
+    chats, moved, imported = place_chats(ShardCoordinator(2, [1]), files, {"chat_config.shard1.json": 1})
+    assert chats == {} and imported == {1: {chat_id: 350.0}}
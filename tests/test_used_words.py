@@ -0,0 +1,88 @@
+import base64
+import json
+
+from ub.used_words import CHUNK_BITS, DENSE_AFTER, UsedWords
+
+WORDS = ["apple", "ant", "banana", "bear", "cat"]
+
+
+def test_round_trip_with_same_dictionary(make_index):
+    index = make_index(WORDS)
+    used = UsedWords()
+    used.add("Bear", index)
+    used.add("zebra", index)  # Not in the index
+    restored = UsedWords.from_dict(used.to_dict(), index, index.fingerprint)
+    assert restored.contains("bear", index) and restored.contains("zebra", index)
+    assert not restored.contains("apple", index)
+    assert len(restored) == 2
+
+
+def test_legacy_word_list(make_index):
+    index = make_index(WORDS)
+    used = UsedWords.from_dict(["apple", "cat"], index)
+    assert used.contains("apple", index) and used.contains("cat", index) and len(used) == 2
+
+
+def test_legacy_dense_bits(make_index):
+    index = make_index(WORDS)
+    bits = base64.b64encode(bytes([1 << index.id_of("ant") | 1 << index.id_of("cat")])).decode()
+    used = UsedWords.from_dict({"bits": bits, "extra": ["zebra"]}, index, index.fingerprint)
+    assert sorted(used.ids()) == sorted([index.id_of("ant"), index.id_of("cat")])
+    assert used.contains("zebra", index) and len(used) == 3
+
+
+def test_rare_word_stays_small():
+    used = UsedWords()
+    used.add_id(285650)  # A rare Case 2 pick
+    assert used.has_id(285650) and not used.has_id(285651) and not used.has_id(1)
+    assert used.nbytes() == 2
+    assert len(json.dumps(used.to_dict())) < 50
+
+
+def test_dense_chunk_round_trip(make_index):
+    index = make_index(WORDS)
+    ids = list(range(5 << CHUNK_BITS, (5 << CHUNK_BITS) + 2 * DENSE_AFTER, 2)) + [3, 1 << 20]
+    used = UsedWords(reversed(ids))
+    assert isinstance(used.chunks[5], bytearray)  # Turned into a bitmap once it held DENSE_AFTER IDs
+    assert list(used.ids()) == sorted(ids) and len(used) == len(ids)
+    restored = UsedWords.from_dict(json.loads(json.dumps(used.to_dict())), index, index.fingerprint)
+    assert list(restored.ids()) == sorted(ids)
+
+
+def test_bitset_merges_both_sides(make_index):
+    index = make_index(WORDS)
+    ours, theirs = UsedWords(), UsedWords()
+    ours.add("ant", index)
+    theirs.add("cat", index)
+    theirs.add("zebra", index)
+    theirs.add_id(3 << CHUNK_BITS)
+    for word_id in range(DENSE_AFTER):
+        theirs.add_id((1 << CHUNK_BITS) + word_id)
+    dense = ours.bitset(theirs)
+    assert all(dense.contains(word, index) for word in ("ant", "cat", "zebra"))
+    assert dense.has_id(3 << CHUNK_BITS) and dense.has_id((1 << CHUNK_BITS) + DENSE_AFTER - 1)
+    assert not dense.has_id((1 << CHUNK_BITS) + DENSE_AFTER)
+    assert not ours.contains("cat", index)
+
+
+def test_remaps_ids_through_replaced_dictionary(make_index):
+    old = make_index(WORDS)
+    new = make_index(["cat", "bear", "dog", "apple"])
+    used = UsedWords()
+    used.add("apple", old)
+    used.add("cat", old)
+    used.add("banana", old)  # Gone from the new dictionary
+    restored = UsedWords.from_dict(used.to_dict(), new, old.fingerprint, old)
+    assert restored.contains("apple", new) and restored.contains("cat", new) and restored.contains("banana", new)
+    assert not restored.contains("bear", new) and not restored.contains("dog", new)
+    assert len(restored) == 3
+
+
+def test_mismatched_ids_dropped_without_replaced_dictionary(make_index):
+    old = make_index(WORDS)
+    new = make_index(["cat", "bear", "dog", "apple"])
+    used = UsedWords()
+    used.add("apple", old)
+    used.add("zebra", old)
+    restored = UsedWords.from_dict(used.to_dict(), new, old.fingerprint)
+    assert restored.contains("zebra", new) and not restored.contains("apple", new)
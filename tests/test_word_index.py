@@ -0,0 +1,79 @@
+import logging
+import random
+import re
+
+from ub import selection
+from ub.selection import LanguageEngines, select_word
+from ub.used_words import UsedBitset
+from ub.word_index import WordIndex, SOURCE_NLTK, SOURCE_WORDFREQ, is_word
+
+
+def old_case1_scan(wordlist, frequencies, nltk_words, start_letter, min_length, used):
+    """Case 1 as get_game_word did it before the index: scan wordfreq, then NLTK, on every prompt."""
+    matching = [
+        word for word in wordlist
+        if len(word) >= min_length and word.lower().startswith(start_letter.lower())
+        and re.match(r'^[a-zA-Z]+$', word) and word.lower() not in used
+    ]
+    if matching:
+        word_freq = [(word, frequencies.get(word.lower(), 0.0)) for word in matching]
+        word_freq.sort(key=lambda x: x[1], reverse=True)
+        return word_freq[0][0].lower()
+    nltk_matching = [
+        word for word in set(nltk_words)
+        if len(word) >= min_length and word.lower().startswith(start_letter.lower())
+        and re.match(r'^[a-zA-Z]+$', word) and word.lower() not in used
+    ]
+    if nltk_matching:
+        nltk_matching.sort()
+        return nltk_matching[0].lower()
+    return None
+
+
+def random_words(rng, count, letters="abcxy"):
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(1, 7))))
+    return sorted(words, key=lambda word: rng.random())
+
+
+def test_index_picks_match_old_scan(corpora, monkeypatch):
+    rng = random.Random(7)
+    wordlist = random_words(rng, 120) + ["don't", "b2b", "x-ray"]
+    rng.shuffle(wordlist)
+    corpora.wordlists["en"] = wordlist
+    corpora.frequencies = {word: rng.choice((1e-3, 1e-4, 1e-5, 1e-6)) for word in wordlist}  # Plenty of ties
+    corpora.nltk_words = [word.capitalize() if rng.random() < 0.3 else word for word in random_words(rng, 150)]
+    index = WordIndex.build("en")
+    monkeypatch.setitem(selection.ENGINES, "en", LanguageEngines(index))
+
+    used_words = set()
+    used = UsedBitset()
+    for _ in range(200):  # Enough to run wordfreq dry for some letters and fall back to NLTK
+        start_letter, min_length = rng.choice("abcxy"), rng.randint(1, 5)
+        expected = old_case1_scan(wordlist, corpora.frequencies, corpora.nltk_words, start_letter, min_length, used_words)
+        picked, _ = select_word(start_letter, min_length, '1', used, language="en")
+        assert (picked and picked.word) == expected, (start_letter, min_length)
+        if expected is not None:
+            used_words.add(expected)
+            used.add_id(picked.word_id)
+    assert any(word not in wordlist for word in used_words)  # NLTK picks were compared too
+
+
+def test_build_without_nltk_corpus(corpora, caplog):
+    corpora.wordlists["en"] = ["apple", "ant", "bear"]
+    corpora.frequencies = {"apple": 1e-3, "ant": 1e-4, "bear": 1e-5}
+    corpora.nltk_words = None  # Not installed, and the download failed
+    with caplog.at_level(logging.WARNING, logger="ub.word_index"):
+        index = WordIndex.build("en")
+    assert len(index) == 3 and index.entries(SOURCE_WORDFREQ, "a")
+    assert index.entries(SOURCE_NLTK, "a") is None
+    assert "wordfreq alone" in caplog.text
+
+
+def test_build_keeps_words_with_combining_marks(corpora):
+    # Vowel signs and viramas are marks, not letters; a number or a word starting with a mark is not a word
+    corpora.wordlists["hi"] = ["में", "है", "की", "और", "प्रधानमंत्री", "२०२४", "ाक"]
+    index = WordIndex.build("hi")
+    assert {index.words[word_id] for word_id in range(len(index))} == {"में", "है", "की", "और", "प्रधानमंत्री"}
+    assert is_word("தமிழ்") and is_word("café") and not is_word("́e") and not is_word("two words")
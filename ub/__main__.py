@@ -1,20 +1,31 @@
 import pyrogram
-from pyrogram import Client, filters
+from pyrogram import Client, filters, idle
 from pyrogram.enums import ChatAction
-import wordfreq
-import nltk
-from nltk.corpus import words
-import re
+from pyrogram.handlers import MessageHandler
 import random
 import asyncio
-import json
+import functools
+import glob
+import time
 import os
-import aiofiles
-from typing import Dict, Set, Optional
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from dotenv import load_dotenv
-from pyrogram.errors import FloodWait
 import logging
 
+from .used_words import UsedWords
+from .journal import ConfigFile, ConfigJournal, read_config
+from .selection import (Selection, ENGINES, INDEX_FINGERPRINTS, get_engines, get_word_index, get_continuation_table,
+                        init_worker, load_replaced_word_index, pin_languages, reset_overlays, select_word, select_ranked)
+from .word_index import DEFAULT_LANGUAGE, WordIndex, is_supported_language, is_word
+from .turn_state import TurnState, Speculation
+from .log_sink import LogSink
+from .scheduler import SendScheduler, PRIORITY_GAME, PRIORITY_ADMIN, PRIORITY_LOG, PRIORITY_NAMES
+from .metrics import Metrics, serve as serve_metrics
+from .sharding import ShardCoordinator, place_chats
+from .rejections import RejectionStore
+from .game_filter import GameFilter, PROMPT_PREFIX, ANY_PROMPT_PATTERN, REJECTION_PATTERN, prompt_pattern
+
 # Set up basic logging
 logging.basicConfig(
     level=logging.INFO,  # Change to DEBUG for more verbosity
@@ -29,240 +40,532 @@ logging.basicConfig(
 logger = logging.getLogger("pyrogram")
 logger.setLevel(logging.INFO)  # Or DEBUG
 
-# Download NLTK words corpus if not already present
-try:
-    nltk.data.find('corpora/words')
-except LookupError:
-    try:
-        nltk.download('words')
-    except Exception as e:
-        print(f"Failed to download NLTK words corpus: {e}")
-
 # Load environment variables
 load_dotenv()
 API_ID = int(os.getenv("API_ID", "0"))
 API_HASH = os.getenv("API_HASH", "")
 SESSION_STRING = os.getenv("SESSION_STRING", "")
+# Sharded mode: one session string per account (shard), comma-separated, and the
+# shards this process runs (e.g. "0,1"; all of them by default)
+SESSION_STRINGS = [s.strip() for s in os.getenv("SESSION_STRINGS", "").split(",") if s.strip()] or [SESSION_STRING]
+SHARDS = os.getenv("SHARDS", "")
+# How each account appears in the game's turn line, comma-separated in shard order
+PLAYER_TAGS = [s.strip() for s in os.getenv("PLAYER_TAGS", "X @ja").split(",")]
+# User IDs of the game bot, comma-separated (learned per chat from the first prompt if unset)
+GAME_BOT_IDS = [int(s) for s in os.getenv("GAME_BOT_IDS", "").split(",") if s.strip()]
+# Confidence (1 - 0.5 ** chats that rejected it) at which a word is excluded everywhere; the
+# default needs two chats, so one flaky or chat-specific rejection does not ban a word
+REJECTION_CONFIDENCE = float(os.getenv("REJECTION_CONFIDENCE", "0.75"))
 LOG_CHAT_ID = int(os.getenv("LOG_CHAT_ID", "0"))
+# "thread", "process", or "auto": Case 3 in processes (its pure-Python search holds the GIL,
+# so threads would run it one chat at a time and slow the event loop), Cases 1 and 2 in threads
+SELECTION_EXECUTOR = os.getenv("SELECTION_EXECUTOR", "auto")
+SELECTION_WORKERS = int(os.getenv("SELECTION_WORKERS", "4"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))  # 0 disables the metrics endpoint
 
 # Authorized user IDs
 ADMIN_IDS = {6783092268, 7360592638}
 
-# Initialize Pyrogram client
-app = Client(
-    "word_game_userbot",
-    api_id=API_ID,
-    api_hash=API_HASH,
-    session_string=SESSION_STRING
-)
+# Chat to account assignment (see ShardCoordinator)
+coordinator = ShardCoordinator(len(SESSION_STRINGS), [int(shard) for shard in SHARDS.split(",")] if SHARDS else None)
+if len(PLAYER_TAGS) < coordinator.shards:
+    # A shard without its own tag would answer prompts meant for another account
+    raise ValueError(f"PLAYER_TAGS has {len(PLAYER_TAGS)} tag(s) for {coordinator.shards} shards; give one per session string")
+
+# Initialize Pyrogram clients, one per local shard; app (the lead) also handles admin commands
+shard_clients: Dict[int, Client] = {
+    shard: Client(
+        "word_game_userbot" if shard == 0 else f"word_game_userbot_{shard}",
+        api_id=API_ID,
+        api_hash=API_HASH,
+        session_string=SESSION_STRINGS[shard]
+    )
+    for shard in coordinator.local
+}
+app = shard_clients[coordinator.lead]
 
 # Data structures
-enabled_chats: Dict[int, Dict[str, str]] = {}  # chat_id -> {alias, name, case}
-used_words: Dict[int, Set[str]] = {}  # chat_id -> set of used words
-CONFIG_FILE = "chat_config.json"
-LETTER_FREQUENCY = None  # Cache for letter frequency
+enabled_chats: Dict[int, Dict[str, str]] = {}  # chat_id -> {alias, name, case, language}
+used_words: Dict[int, UsedWords] = {}  # chat_id -> used words (by ID in the chat language's word index)
+# Each shard keeps its chats in its own config file (see config_files and place_chats)
+moved_chats: Dict[int, Dict[int, dict]] = {shard: {} for shard in coordinator.local}  # shard -> chats its file keeps for other shards
+imported_chats: Dict[int, Dict[int, float]] = {shard: {} for shard in coordinator.local}  # shard -> chat_id -> when taken over from another file
+RUNS_WAIT = 2.0  # Seconds the coordinator gives the other shard processes to write out their changes before /runs
+REJECTIONS_FILE = "rejections.json"  # Shared by all shard processes
+REJECTIONS_LISTED = 30  # Entries shown by /rejections
+selection_executors: Dict[str, Executor] = {}  # "thread"/"process" -> pool that runs select_word
+selection_locks: Dict[int, asyncio.Lock] = {}  # One word selection at a time per chat
+turn_states: Dict[int, TurnState] = {}  # chat_id -> last parsed prompt and its backup word
+speculations: Dict[int, Speculation] = {}  # chat_id -> our next move, while the player before us answers
+speculative_jobs: Dict[int, asyncio.Future] = {}  # chat_id -> speculative search still running (it cannot be stopped)
 INITIALIZED = False  # Flag to ensure load_config runs only once
 last_bot_message_id: Dict[int, int] = {}  # Track last bot message ID per chat
+game_filter = GameFilter(GAME_BOT_IDS)  # Drops non-game group traffic before handler dispatch
+
+# Timing
+PROMPT_TYPING_DELAY = 2  # Seconds between a prompt and our word
+RETRY_TYPING_DELAY = 1.5  # Seconds between a rejection and our retry word
+LOOKAHEAD_MARGIN = 0.5  # Seconds of the typing delay kept free after a Case 3 search
+BACKUP_TIME_BUDGET = 0.25  # Seconds of Case 3 search for a backup word, which most prompts never need
+
+# Hot-path timings and counters, served at http://METRICS_HOST:METRICS_PORT/metrics
+metrics = Metrics()
+metrics.describe("ub_prompt_parse_seconds", "histogram", "Time to match a game message against the prompt pattern")
+metrics.describe("ub_selection_seconds", "histogram", "Time to pick a word, including the wait for a selection worker")
+metrics.describe("ub_selection_stage_seconds", "histogram", "Time spent in each word selection stage")
+metrics.describe("ub_save_config_seconds", "histogram", "Time to append to the config journal or write a snapshot")
+metrics.describe("ub_send_seconds", "histogram", "Time from queueing a message to its delivery, including FloodWait pauses")
+metrics.describe("ub_prompts_total", "counter", "Game prompts received")
+metrics.describe("ub_speculation_total", "counter", "Prompts answered from (hit) or despite (miss) a speculative pick")
+metrics.describe("ub_rejections_total", "counter", "Our words rejected by the game bot")
+metrics.describe("ub_no_word_total", "counter", "Prompts and retries with no valid word left")
+metrics.describe("ub_send_queue_depth", "gauge", "Messages waiting in the send scheduler")
+metrics.describe("ub_send_flood_waits_total", "counter", "FloodWait errors seen by the send scheduler")
+metrics.describe("ub_send_flood_wait_seconds_total", "counter", "Seconds of FloodWait requested by Telegram")
+metrics.describe("ub_send_dropped_total", "counter", "Stale game words dropped from the send queue")
+metrics.describe("ub_log_queue_depth", "gauge", "Log entries waiting for the next digest")
+metrics.describe("ub_log_dropped_total", "counter", "Log entries that did not fit in the log queue")
+metrics.describe("ub_used_words", "gauge", "Words used in a chat so far")
+metrics.describe("ub_excluded_words", "gauge", "Words excluded in every chat after game bot rejections")
+metrics.describe("ub_loaded_languages", "gauge", "Languages whose word index is loaded in this process")
+metrics.describe("ub_filter_passed_total", "counter", "Messages from enabled chats let through to the game handler")
+metrics.describe("ub_filter_dropped_total", "counter", "Messages from enabled chats dropped by the game filter")
+
+# Function to get the metric labels for a chat
+def chat_labels(chat_id: int) -> Dict[str, str]:
+    return {"chat": str(chat_id), "case": enabled_chats.get(chat_id, {}).get('case', '')}
+
+# Function to get the game language of a chat (chats enabled before languages existed play English)
+def chat_language(chat_id: int) -> str:
+    return enabled_chats.get(chat_id, {}).get('language', DEFAULT_LANGUAGE)
+
+# Function to load a language's word index and engines off the event loop (the first use may build the index)
+async def load_language(language: str):
+    if language not in ENGINES:
+        await asyncio.get_running_loop().run_in_executor(None, get_engines, language)
+
+# Function to read the gauges at scrape time (runs on the metrics server thread)
+def collect_metrics():
+    for shard, scheduler in send_schedulers.items():
+        for priority, name in enumerate(PRIORITY_NAMES):
+            yield "ub_send_queue_depth", {"shard": shard, "priority": name}, scheduler.depth(priority)
+        yield "ub_send_flood_waits_total", {"shard": shard}, scheduler.flood_waits
+        yield "ub_send_flood_wait_seconds_total", {"shard": shard}, scheduler.flood_wait_seconds
+        yield "ub_send_dropped_total", {"shard": shard}, scheduler.dropped
+    yield "ub_log_queue_depth", {}, len(log_sink)
+    yield "ub_log_dropped_total", {}, log_sink.dropped
+    yield "ub_excluded_words", {}, rejection_store.excluded_count()
+    yield "ub_loaded_languages", {}, len(ENGINES)
+    yield "ub_filter_passed_total", {}, game_filter.passed
+    yield "ub_filter_dropped_total", {}, game_filter.dropped
+    for chat_id, chat_used in list(used_words.items()):
+        yield "ub_used_words", chat_labels(chat_id), len(chat_used)
+
+metrics.add_collector(collect_metrics)
+
+# Function to get a shard's config snapshot and journal files (shard 0 keeps the names from before sharding)
+def config_files(shard: int) -> Tuple[str, str]:
+    if shard == 0:
+        return "chat_config.json", "chat_config.journal"
+    return f"chat_config.shard{shard}.json", f"chat_config.shard{shard}.journal"
+
+# Function to build a shard's full config snapshot
+def config_snapshot(shard: int) -> dict:
+    chats = [chat_id for chat_id in enabled_chats if coordinator.shard_for(chat_id) == shard]
+    return {
+        'enabled_chats': {chat_id: enabled_chats[chat_id] for chat_id in chats},
+        'used_words': {chat_id: used_words[chat_id].to_dict() for chat_id in chats if chat_id in used_words},
+        # Fingerprint of each language's index, to tell whether saved IDs still map to the same words
+        'used_words_index': {
+            language: INDEX_FINGERPRINTS[language]
+            for language in {chat_language(chat_id) for chat_id in chats if chat_id in used_words}
+            if language in INDEX_FINGERPRINTS
+        },
+        'moved_chats': moved_chats[shard],
+        'imported_chats': imported_chats[shard],
+    }
 
-# Function to load chat config
+# Log chat delivery, batched off the reply path
+log_sink = LogSink(lambda text: send_scheduler.send(LOG_CHAT_ID, text, PRIORITY_LOG))
+
+# Function to report config write failures
+async def report_config_error(e: Exception):
+    log_sink.log(f"Failed to save config: {e}")
+
+# Function to report rejection store write failures
+async def report_rejections_error(e: Exception):
+    log_sink.log(f"Failed to save rejected words: {e}")
+
+# Words rejected by the game bot, excluded for every chat in the same language (Case 2 overlays are rebuilt when that changes)
+rejection_store = RejectionStore(
+    REJECTIONS_FILE, REJECTION_CONFIDENCE, on_error=report_rejections_error, on_change=reset_overlays
+)
+
+# Journals of config changes, one per local shard, folded into the shard's config file periodically
+config_journals: Dict[int, ConfigJournal] = {
+    shard: ConfigJournal(
+        *config_files(shard), functools.partial(config_snapshot, shard), report_config_error,
+        on_write=lambda kind, seconds: metrics.observe("ub_save_config_seconds", seconds, op=kind)
+    )
+    for shard in coordinator.local
+}
+
+# Function to get the journal of the shard that plays a chat
+def journal_for(chat_id: int) -> ConfigJournal:
+    return config_journals.get(coordinator.shard_for(chat_id), config_journals[coordinator.lead])
+
+# Function to read every config file in the working directory (other shards' files and ones left from older layouts too)
+async def read_config_files() -> Dict[str, ConfigFile]:
+    own = {config_files(shard)[0] for shard in coordinator.local}
+    paths = own | set(glob.glob("chat_config*.json"))
+    paths |= {path[:-len(".journal")] + ".json" for path in glob.glob("chat_config*.journal")}
+    files = {}
+    for path in sorted(paths):
+        try:
+            files[path] = await read_config(path, path[:-len(".json")] + ".journal")
+        except Exception as e:
+            if path in own:
+                raise
+            log_sink.log(f"Skipped config file {path}: {e}")
+    return files
+
+# Function to rebuild a chat's used words from a saved config record (see replay_chats)
+def restore_used_words(chat_id: int, record: dict, replaced_indexes: Dict[str, Optional[WordIndex]]) -> UsedWords:
+    language = chat_language(chat_id)
+    index = get_word_index(language)
+    saved, data = record['index'], record['used']
+    replaced = None
+    if isinstance(data, dict) and (data.get('ids') or data.get('bitmaps') or data.get('bits')) and saved != index.fingerprint:
+        if language not in replaced_indexes:
+            replaced_indexes[language] = load_replaced_word_index(language, saved)
+        replaced = replaced_indexes[language]
+        if replaced is None:
+            log_sink.log(f"Chat {chat_id}: used words were saved against another {language} dictionary ({saved}) that was not kept, so they were dropped and may be played again")
+    chat_used = UsedWords() if data is None else UsedWords.from_dict(data, index, saved, replaced)
+    for word in record['words']:
+        chat_used.add(word, index)
+    return chat_used
+
+# Function to load chat config (each local shard's snapshot plus journal, and chats taken over from other shards)
 async def load_config():
     global enabled_chats, used_words
-    if os.path.exists(CONFIG_FILE):
+    own = {config_files(shard)[0]: shard for shard in coordinator.local}
+    try:
+        files = await read_config_files()
+        chats, moved, imported = place_chats(coordinator, files, own)
+    except Exception as e:
+        log_sink.log(f"Failed to load config: {e}")
+        files, chats, moved, imported = None, {}, {}, {}
+    # Load only the languages in play, each on its own: one that fails takes down just its chats
+    languages = {record['info'].get('language', DEFAULT_LANGUAGE) for _, record, _ in chats.values()}
+    pin_languages(languages)
+    unavailable = set()
+    for language in languages:
         try:
-            async with aiofiles.open(CONFIG_FILE, 'r') as f:
-                data = json.loads(await f.read())
-                enabled_chats = {int(k): v for k, v in data.get('enabled_chats', {}).items()}
-                used_words = {int(k): set(v) for k, v in data.get('used_words', {}).items()}
+            await load_language(language)
         except Exception as e:
-            await safe_send_message(LOG_CHAT_ID, f"Failed to load config: {e}")
-            enabled_chats = {}
-            used_words = {}
-    else:
+            unavailable.add(language)
+            log_sink.log(f"Failed to load {language} words: {e}")
+    # Build their Case 2 and 3 engines before handling any prompts
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, init_worker, languages - unavailable)
+    except Exception as e:
+        log_sink.log(f"Failed to prepare word selection engines: {e}")
+    try:
         enabled_chats = {}
         used_words = {}
-
-# Function to save chat config
-async def save_config():
+        replaced_indexes = {}  # language -> the index its saved IDs refer to, when the dictionary was rebuilt since
+        for shard in coordinator.local:
+            imported_chats[shard] = imported.get(shard, {})
+            moved_chats[shard] = moved.get(shard, {})
+        taken_over = time.time()
+        for chat_id, (shard, record, path) in chats.items():
+            info = record['info']
+            language = info.get('language', DEFAULT_LANGUAGE)
+            if language in unavailable:
+                log_sink.log(f"Disabled chat {chat_id} ({info['name']}): could not load its {language} words; enable it again with /on once they load")
+                continue
+            enabled_chats[chat_id] = info
+            used_words[chat_id] = restore_used_words(chat_id, record, replaced_indexes)
+            if path not in own:
+                imported_chats[shard][chat_id] = taken_over
+                log_sink.log(f"Took over chat {chat_id} ({info['name']}) for shard {shard} from {path}, with {len(used_words[chat_id])} used words")
+        for shard, kept in moved_chats.items():
+            for chat_id, record in kept.items():
+                if not record.get('moved'):
+                    log_sink.log(f"Chat {chat_id} ({record['info']['name']}) now belongs to shard {coordinator.shard_for(chat_id)}; shard {shard} keeps it until that shard takes it over")
+        if files is not None:
+            await save_config()  # Each local file now holds exactly its shard's chats
+    except Exception as e:
+        log_sink.log(f"Failed to load config: {e}")
+        enabled_chats = {}
+        used_words = {}
+    refresh_game_chats()
     try:
-        async with aiofiles.open(CONFIG_FILE, 'w') as f:
-            await f.write(json.dumps({
-                'enabled_chats': enabled_chats,
-                'used_words': {k: list(v) for k, v in used_words.items()}
-            }))
+        rejection_store.bind(get_word_index)
+        await rejection_store.load()
+        rejection_store.start()  # Pick up other processes' rejections as they write them
     except Exception as e:
-        await safe_send_message(LOG_CHAT_ID, f"Failed to save config: {e}")
+        log_sink.log(f"Failed to load rejected words: {e}")
+
+# Function to rebuild the game filter's per-shard chat sets after enabled_chats changes
+def refresh_game_chats():
+    game_filter.compile({
+        shard: [chat_id for chat_id in enabled_chats if coordinator.shard_for(chat_id) == shard]
+        for shard in coordinator.local
+    })
+    # Languages in play stay loaded, so the synchronous index lookups on the event loop never reload one
+    pin_languages(chat_language(chat_id) for chat_id in enabled_chats)
+
+# Function to save chat config (full snapshots, empties the journals)
+async def save_config():
+    if any(moved_chats.values()):
+        # Forget moved chats that their new shard has taken over
+        try:
+            files = await read_config_files()
+        except Exception as e:
+            log_sink.log(f"Failed to check moved chats: {e}")
+            files = {}
+        for shard, kept in moved_chats.items():
+            own = config_files(shard)[0]
+            for chat_id in [chat_id for chat_id in kept
+                            if any(chat_id in config.imported for path, config in files.items() if path != own)]:
+                del kept[chat_id]
+    for journal in config_journals.values():
+        await journal.compact()
 
 # Function to generate 4-digit alias
 def generate_alias() -> str:
     return str(random.randint(1000, 9999))
 
-# Function to count words starting with each letter in wordfreq
-def get_letter_frequency() -> Dict[str, int]:
-    global LETTER_FREQUENCY
-    if LETTER_FREQUENCY is None:
-        LETTER_FREQUENCY = {chr(i): 0 for i in range(ord('a'), ord('z') + 1)}
-        wordfreq_words = wordfreq.top_n_list('en', 300000)  # Top 10,000 words
-        for word in wordfreq_words:
-            if word and re.match(r'^[a-zA-Z]+$', word):
-                first_letter = word.lower()[0]
-                if first_letter in LETTER_FREQUENCY:
-                    LETTER_FREQUENCY[first_letter] += 1
-    return LETTER_FREQUENCY
-
-# Function for safe message sending with flood control
-async def safe_send_message(chat_id, text, **kwargs):
+# Function to get the word selection pool for a case (created on first use)
+def get_selection_executor(case: str) -> Executor:
+    kind = SELECTION_EXECUTOR
+    if kind == "auto":
+        kind = "process" if case == '3' else "thread"
+    executor = selection_executors.get(kind)
+    if executor is None:
+        if kind == "process":
+            # Workers warm up the languages in play when the pool starts; others load on first use
+            languages = tuple({chat_language(chat_id) for chat_id in enabled_chats})
+            executor = ProcessPoolExecutor(SELECTION_WORKERS, initializer=init_worker, initargs=(languages,))
+        else:
+            executor = ThreadPoolExecutor(SELECTION_WORKERS, thread_name_prefix="word-selection")
+        selection_executors[kind] = executor
+    return executor
+
+# Function to record a word as used in a chat
+def mark_word_used(chat_id: int, word: str):
+    word = word.lower()
+    language = chat_language(chat_id)
+    index = get_word_index(language)
+    chat_used = used_words.setdefault(chat_id, UsedWords())
+    word_id = index.id_of(word)
+    # Excluded words are already out of the chat's overlay
+    if (word_id is not None and not chat_used.has_id(word_id)
+            and not rejection_store.excluded_for(language).has_id(word_id)):
+        get_continuation_table(language).use(chat_id, word_id)
+    chat_used.add(word, index)
+    journal_for(chat_id).record('use', chat_id, word=word)
+
+# Function to forget a chat's used words
+def reset_used_words(chat_id: int, disable: bool = False):
+    if disable:
+        used_words.pop(chat_id, None)
+    else:
+        used_words[chat_id] = UsedWords()
+    reset_overlays(chat_id)
+
+# Outbound send queues, one per local account (each account has its own flood limits)
+send_schedulers: Dict[int, SendScheduler] = {
+    shard: SendScheduler(lambda *args, shard=shard, **kwargs: shard_clients[shard].send_message(*args, **kwargs))
+    for shard in coordinator.local
+}
+send_scheduler = send_schedulers[coordinator.lead]  # Admin replies and logs
+
+# Function to get the client that plays a chat (the lead client for other chats)
+def client_for(chat_id: int) -> Client:
+    return shard_clients.get(coordinator.shard_for(chat_id), app)
+
+# Function to get the send queue for a chat
+def scheduler_for(chat_id: int) -> SendScheduler:
+    if chat_id in enabled_chats:
+        return send_schedulers.get(coordinator.shard_for(chat_id), send_scheduler)
+    return send_scheduler
+
+# Function to get how the account playing a chat appears in the game's turn line
+def player_tag(chat_id: int) -> str:
+    return PLAYER_TAGS[coordinator.shard_for(chat_id)]
+
+# Function to decide whether this process answers an admin command
+def handles_command(chat_id: Optional[int] = None) -> bool:
+    """
+    Every process sees every admin command. Commands about a chat are handled
+    by the process that owns it; anything else (usage errors, unparsable chat
+    IDs) by the coordinator.
+    """
+    return coordinator.is_coordinator if chat_id is None else coordinator.owns(chat_id)
+
+# Function to describe which shard plays a chat, for admin replies
+def shard_note(chat_id: int) -> str:
+    return f", shard {coordinator.shard_for(chat_id)}" if coordinator.shards > 1 else ""
+
+# Function for safe message sending with flood control (see SendScheduler)
+async def safe_send_message(chat_id, text, priority=PRIORITY_ADMIN, **kwargs):
     try:
-        message = await app.send_message(chat_id, text, **kwargs)
-        if chat_id in enabled_chats and 'disable_notification' in kwargs and kwargs['disable_notification']:
+        with metrics.timer("ub_send_seconds", priority=PRIORITY_NAMES[priority], **chat_labels(chat_id)):
+            message = await scheduler_for(chat_id).send(chat_id, text, priority, **kwargs)
+        if message is not None and chat_id in enabled_chats and 'disable_notification' in kwargs and kwargs['disable_notification']:
             last_bot_message_id[chat_id] = message.id  # Track bot's game word message
         return message
-    except FloodWait as e:
-        await asyncio.sleep(e.x)
-        message = await app.send_message(chat_id, text, **kwargs)
-        if chat_id in enabled_chats and 'disable_notification' in kwargs and kwargs['disable_notification']:
-            last_bot_message_id[chat_id] = message.id
-        return message
     except Exception as e:
         print(f"Error sending message to {chat_id}: {e}")
-        if chat_id != LOG_CHAT_ID:  # Avoid infinite recursion
-            await safe_send_message(LOG_CHAT_ID, f"Error sending message to {chat_id}: {e}")
+        if chat_id != LOG_CHAT_ID:  # Don't report log chat failures to the log chat
+            log_sink.log(f"Error sending message to {chat_id}: {e}")
         return None
 
+# Function to format a word for sending
+def format_game_word(word: str) -> str:
+    return word[0].upper() + word[1:].lower()
+
+# Function to run a selection function (select_word or select_ranked) in the selection pool
+async def run_in_selection_pool(select, chat_id: int, start_letter: str, min_length: int, case: str,
+                                time_budget: float, mode: str, *args):
+    started = time.perf_counter()
+    language = chat_language(chat_id)
+    await load_language(language)  # Evicted or never loaded in this process
+    chat_used = used_words.setdefault(chat_id, UsedWords())
+    # Hand the pool copies, so handlers can keep updating the originals.
+    # Words rejected anywhere in this language count as used here too.
+    used_snapshot = chat_used.bitset(rejection_store.excluded_for(language))
+    live = get_continuation_table(language).overlay(chat_id, used_snapshot).copy() if case == '2' else None
+    result, stages = await asyncio.get_running_loop().run_in_executor(
+        get_selection_executor(case),
+        functools.partial(select, start_letter, min_length, case, used_snapshot, live, time_budget, *args,
+                          language=language)
+    )
+    labels = {"chat": str(chat_id), "case": case, "mode": mode}
+    metrics.observe("ub_selection_seconds", time.perf_counter() - started, **labels)
+    for stage, seconds in stages.items():
+        metrics.observe("ub_selection_stage_seconds", seconds, stage=stage, **labels)
+    return result
+
+# Function to run select_word in the selection pool
+async def run_selection(chat_id: int, start_letter: str, min_length: int, case: str,
+                        time_budget: float, mode: str = "turn") -> Optional[Selection]:
+    return await run_in_selection_pool(select_word, chat_id, start_letter, min_length, case, time_budget, mode)
+
 # Function to retrieve game word
-async def get_game_word(start_letter: str, min_length: int, chat_id: int, case: str) -> Optional[str]:
+async def get_game_word(start_letter: str, min_length: int, chat_id: int, case: str,
+                        time_budget: float = PROMPT_TYPING_DELAY - LOOKAHEAD_MARGIN,
+                        precomputed: Optional[Selection] = None) -> Optional[str]:
     """
     Get a word starting with start_letter, at least min_length, for the given chat.
-    Case 1: Use wordfreq (highest frequency), then NLTK (alphabetical).
-    Case 2: Use wordfreq (top 10,000, prefer least frequent ending letters), then NLTK.
+    The choice itself (see select_word) runs in the selection pool, so other chats
+    keep being served meanwhile; this records the word and logs it. A word picked
+    ahead of time for the same prompt (a retry backup or a speculative pick) is
+    used as-is if it is still unused.
     Avoid chat-specific duplicates. Capitalize first letter for output.
     """
-    if chat_id not in used_words:
-        used_words[chat_id] = set()
-    
-    # Step 1: Try wordfreq
-    wordfreq_words = wordfreq.top_n_list('en', 321180)  # Top 10,000 words
-    matching_words = [
-        word for word in wordfreq_words
-        if len(word) >= min_length
-        and word.lower().startswith(start_letter.lower())
-        and re.match(r'^[a-zA-Z]+$', word)
-        and word.lower() not in used_words[chat_id]
-    ]
-    
-    if matching_words:
-        if case == '1':
-            # Case 1: Pick highest frequency word
-            word_freq = [(word, wordfreq.word_frequency(word.lower(), 'en')) for word in matching_words if len(word) >= min_length]
-            if not word_freq:
-                await safe_send_message(LOG_CHAT_ID, f"No wordfreq words meet min_length {min_length} for '{start_letter}' in chat {chat_id}")
-            else:
-                word_freq.sort(key=lambda x: x[1], reverse=True)
-                selected_word = word_freq[0][0]
-                frequency = word_freq[0][1]
-                if len(selected_word) >= min_length:
-                    used_words[chat_id].add(selected_word.lower())
-                    await save_config()
-                    await safe_send_message(LOG_CHAT_ID, f"Sent word (Case 1): {selected_word} (length={len(selected_word)}, freq={frequency:.6f}) to chat {chat_id} ({enabled_chats[chat_id]['name']})")
-                    return selected_word[0].upper() + selected_word[1:].lower()
-                else:
-                    await safe_send_message(LOG_CHAT_ID, f"Selected word {selected_word} (length={len(selected_word)}) does not meet min_length {min_length} in Case 1")
-        elif case == '2':
-            # Case 2: Prefer words ending with least frequent letters
-            letter_counts = get_letter_frequency()
-            min_count = min(letter_counts.values())
-            least_frequent_letters = [letter for letter, count in letter_counts.items() if count == min_count]
-            default_letters = ['x', 'y', 'z']
-            target_end_letters = least_frequent_letters if least_frequent_letters else default_letters
-            
-            # Filter words ending with target letters, ensuring min_length
-            valid_words = [
-                (word, wordfreq.word_frequency(word.lower(), 'en'))
-                for word in matching_words
-                if word.lower()[-1] in target_end_letters and len(word) >= min_length
-            ]
-            if valid_words:
-                # Pick highest frequency among valid words
-                valid_words.sort(key=lambda x: x[1])
-                selected_word = valid_words[0][0]
-                frequency = valid_words[0][1]
-                if len(selected_word) >= min_length:
-                    used_words[chat_id].add(selected_word.lower())
-                    await save_config()
-                    await safe_send_message(LOG_CHAT_ID, f"Sent word (Case 2, ends with {selected_word.lower()[-1]}): {selected_word} (length={len(selected_word)}, freq={frequency:.6f}) to chat {chat_id}")
-                    return selected_word[0].upper() + selected_word[1:].lower()
-                else:
-                    await safe_send_message(LOG_CHAT_ID, f"Selected word {selected_word} (length={len(selected_word)}) does not meet min_length {min_length} in Case 2")
-            # Fallback to any wordfreq word
-            word_freq = [(word, wordfreq.word_frequency(word.lower(), 'en')) for word in matching_words if len(word) >= min_length]
-            if word_freq:
-                word_freq.sort(key=lambda x: x[1])
-                selected_word = word_freq[0][0]
-                frequency = word_freq[0][1]
-                if len(selected_word) >= min_length:
-                    used_words[chat_id].add(selected_word.lower())
-                    await save_config()
-                    await safe_send_message(LOG_CHAT_ID, f"Sent word (Case 2, no target ending): {selected_word} (length={len(selected_word)}, freq={frequency:.6f}) to chat {chat_id} ({enabled_chats[chat_id]['name']})")
-                    return selected_word[0].upper() + selected_word[1:].lower()
-                else:
-                    await safe_send_message(LOG_CHAT_ID, f"Selected word {selected_word} (length={len(selected_word)}) does not meet min_length {min_length} in Case 2")
-    
-    # Step 2: Fall back to NLTK
-    nltk_word_set = set(words.words())
-    nltk_matching_words = [
-        word for word in nltk_word_set
-        if len(word) >= min_length
-        and word.lower().startswith(start_letter.lower())
-        and re.match(r'^[a-zA-Z]+$', word)
-        and word.lower() not in used_words[chat_id]
-    ]
-    
-    if nltk_matching_words:
-        if case == '1':
-            # Case 1: Pick first alphabetically
-            nltk_matching_words.sort()
-            selected_word = nltk_matching_words[0]
-            if len(selected_word) >= min_length:
-                used_words[chat_id].add(selected_word.lower())
-                await save_config()
-                await safe_send_message(LOG_CHAT_ID, f"Sent word (Case 1, NLTK): {selected_word} (length={len(selected_word)}) to chat {chat_id} ({enabled_chats[chat_id]['name']})")
-                return selected_word[0].upper() + selected_word[1:].lower()
-            else:
-                await safe_send_message(LOG_CHAT_ID, f"Selected NLTK word {selected_word} (length={len(selected_word)}) does not meet min_length {min_length} in Case 1")
-        elif case == '2':
-            # Case 2: Try words ending with least frequent letters
-            letter_counts = get_letter_frequency()
-            min_count = min(letter_counts.values())
-            least_frequent_letters = [letter for letter, count in letter_counts.items() if count == min_count]
-            default_letters = ['x', 'y', 'z']
-            target_end_letters = least_frequent_letters if least_frequent_letters else default_letters
-            
-            valid_nltk_words = [
-                word for word in nltk_matching_words
-                if word.lower()[-1] in target_end_letters and len(word) >= min_length
-            ]
-            if valid_nltk_words:
-                valid_nltk_words.sort()
-                selected_word = valid_nltk_words[0]
-                if len(selected_word) >= min_length:
-                    used_words[chat_id].add(selected_word.lower())
-                    await save_config()
-                    await safe_send_message(LOG_CHAT_ID, f"Sent word (Case 2, NLTK, ends with {selected_word.lower()[-1]}): {selected_word} (length={len(selected_word)}) to chat {chat_id} ({enabled_chats[chat_id]['name']})")
-                    return selected_word[0].upper() + selected_word[1:].lower()
-                else:
-                    await safe_send_message(LOG_CHAT_ID, f"Selected NLTK word {selected_word} (length={len(selected_word)}) does not meet min_length {min_length} in Case 2")
-            # Fallback to any NLTK word
-            nltk_matching_words.sort()
-            selected_word = nltk_matching_words[0]
-            if len(selected_word) >= min_length:
-                used_words[chat_id].add(selected_word.lower())
-                await save_config()
-                await safe_send_message(LOG_CHAT_ID, f"Sent word (Case 2, NLTK, no target ending): {selected_word} (length={len(selected_word)}) to chat {chat_id} ({enabled_chats[chat_id]['name']})")
-                return selected_word[0].upper() + selected_word[1:].lower()
-            else:
-                await safe_send_message(LOG_CHAT_ID, f"Selected NLTK word {selected_word} (length={len(selected_word)}) does not meet min_length {min_length} in Case 2")
+    async with selection_locks.setdefault(chat_id, asyncio.Lock()):
+        language = chat_language(chat_id)
+        if (precomputed is not None
+                and not used_words.setdefault(chat_id, UsedWords()).contains(precomputed.word, get_word_index(language))
+                and not rejection_store.is_excluded(precomputed.word, language)):
+            selection = precomputed
+        else:
+            selection = await run_selection(chat_id, start_letter, min_length, case, time_budget)
+        if selection is not None:
+            mark_word_used(chat_id, selection.word)
     
-    await safe_send_message(LOG_CHAT_ID, f"No valid word found for '{start_letter}' with min length {min_length} in chat {chat_id} ({enabled_chats[chat_id]['name']})")
-    return None
+    if selection is None:
+        metrics.inc("ub_no_word_total", **chat_labels(chat_id))
+        log_sink.log(f"No valid word found for '{start_letter}' with min length {min_length} in chat {chat_id} ({enabled_chats[chat_id]['name']})")
+        return None
+    selected_word = selection.word
+    details = f"length={len(selected_word)}"
+    if selection.frequency is not None:
+        details += f", freq={selection.frequency:.6f}"
+    log_sink.log(f"Sent word ({selection.label}): {selected_word} ({details}) to chat {chat_id} ({enabled_chats[chat_id]['name']})")
+    return format_game_word(selected_word)
+
+# Function to pick the next candidate for a prompt while our word is in flight
+async def prefetch_backup(chat_id: int, state: TurnState, case: str):
+    try:
+        selection = await run_selection(chat_id, state.start_letter, state.min_length, case,
+                                        min(BACKUP_TIME_BUDGET, RETRY_TYPING_DELAY - LOOKAHEAD_MARGIN), mode="backup")
+    except Exception as e:
+        log_sink.log(f"Error picking backup word in chat {chat_id}: {e}")
+        return
+    if selection is not None and turn_states.get(chat_id) is state:
+        state.backup = selection._replace(label=selection.label + ", backup")
+
+# Function to pick our move and its backup for a likely next prompt
+async def speculate(chat_id: int, start_letter: str, min_length: int, case: str) -> List[Selection]:
+    try:
+        picks = await run_in_selection_pool(select_ranked, chat_id, start_letter, min_length, case,
+                                            PROMPT_TYPING_DELAY - LOOKAHEAD_MARGIN, "speculative", 2)
+    except Exception as e:
+        log_sink.log(f"Error picking speculative word in chat {chat_id}: {e}")
+        return []
+    return [pick._replace(label=pick.label + suffix) for pick, suffix in zip(picks, (", speculative", ", speculative backup"))]
+
+# Function to stop speculating in a chat (a search still running finishes in the pool and is ignored)
+def drop_speculation(chat_id: int):
+    speculations.pop(chat_id, None)
+    game_filter.unwatch(chat_id)
+
+# Function to follow another player's prompt: if we are next, watch for their word
+def watch_turn(chat_id: int, text: str):
+    drop_speculation(chat_id)
+    match = ANY_PROMPT_PATTERN.match(text)
+    if match and match.group(2) == player_tag(chat_id):
+        speculations[chat_id] = Speculation(match.group(3), int(match.group(4)))
+        game_filter.watch(chat_id)
+
+# Function to start on our move from a word the player before us sent (its last letter starts our turn)
+def speculate_on(chat_id: int, user, word: str):
+    speculation = speculations.get(chat_id)
+    # Only a person's single word counts (not e.g. the game bot rejecting it)
+    if speculation is None or user is None or user.is_bot or not is_word(word) or not speculation.fits(word):
+        return
+    speculation.start_letter = word[-1].lower()
+    start_speculation(chat_id)
+
+# Function to start the speculative search for a chat's latest likely start letter
+def start_speculation(chat_id: int):
+    speculation = speculations.get(chat_id)
+    if speculation is None or speculation.start_letter in (None, speculation.searched) or chat_id not in enabled_chats:
+        return  # Nothing new to search (e.g. their previous word was rejected)
+    job = speculative_jobs.get(chat_id)
+    if job is not None and not job.done():
+        # Cancelling the task would not stop the search in the pool, so a superseded one runs
+        # to the end; the latest letter is searched when it finishes
+        return
+    speculation.searched = speculation.start_letter
+    speculation.task = job = speculative_jobs[chat_id] = asyncio.ensure_future(
+        speculate(chat_id, speculation.searched, speculation.min_length, enabled_chats[chat_id]['case'])
+    )
+    job.add_done_callback(lambda _: finish_speculation(chat_id, job))
+
+# Function to follow up on a finished speculative search
+def finish_speculation(chat_id: int, job: asyncio.Future):
+    if speculative_jobs.get(chat_id) is job:
+        del speculative_jobs[chat_id]
+        start_speculation(chat_id)  # Their word changed while it ran
+
+# Function to collect the speculative move and backup for the prompt we just got ([] if they do not fit it)
+async def take_speculation(chat_id: int, start_letter: str, min_length: int) -> List[Selection]:
+    speculation = speculations.pop(chat_id, None)
+    game_filter.unwatch(chat_id)
+    if speculation is None or speculation.task is None:
+        return []
+    hit = speculation.searched == start_letter.lower() and speculation.min_length == min_length
+    metrics.inc("ub_speculation_total", outcome="hit" if hit else "miss", **chat_labels(chat_id))
+    if not hit:
+        return []  # A search still running is left to finish; its picks are not used
+    return await speculation.task
 
 # Command handler: Enable chat
 @app.on_message(filters.command("on"))
@@ -270,30 +573,48 @@ async def enable_chat(client, message):
     if message.from_user.id not in ADMIN_IDS:
         print(f"Unauthorized /on attempt by user {message.from_user.id}")
         return
-    if len(message.command) != 3:
-        await safe_send_message(LOG_CHAT_ID, "Usage: /on {chat_id} {case}")
+    if len(message.command) not in (3, 4):
+        if handles_command():
+            await safe_send_message(LOG_CHAT_ID, "Usage: /on {chat_id} {case} [language]")
         return
+    chat_id = None
     try:
         chat_id = int(message.command[1])
+        if not handles_command(chat_id):
+            return  # Another process plays this chat
         case = message.command[2]
-        if case not in ['1', '2']:
+        if case not in ['1', '2', '3']:
             await safe_send_message(LOG_CHAT_ID, f"Failed to enable chat {chat_id}: Invalid case {case}")
             return
+        language = message.command[3].lower() if len(message.command) == 4 else DEFAULT_LANGUAGE
         if chat_id not in enabled_chats:
-            chat = await client.get_chat(chat_id)
+            if not is_supported_language(language):
+                await safe_send_message(LOG_CHAT_ID, f"Failed to enable chat {chat_id}: Unsupported language {language}")
+                return
+            chat = await client_for(chat_id).get_chat(chat_id)
             chat_name = chat.title if chat.type in ["group", "supergroup"] else chat.username or f"{chat.first_name or ''} {chat.last_name or ''}".strip()
+            # Load the language's word index before the first prompt needs it
+            try:
+                await load_language(language)
+            except Exception as e:
+                await safe_send_message(LOG_CHAT_ID, f"Failed to enable chat {chat_id}: Could not load {language} words: {e}")
+                return
             alias = generate_alias()
-            enabled_chats[chat_id] = {"alias": alias, "name": chat_name, "case": case}
-            used_words[chat_id] = set()
-            await save_config()
-            log_message = f"Enabled chat {chat_id} ({chat_name}) with alias {alias}, case {case}"
+            enabled_chats[chat_id] = {"alias": alias, "name": chat_name, "case": case, "language": language}
+            refresh_game_chats()
+            reset_used_words(chat_id)
+            journal_for(chat_id).record('enable', chat_id, info=enabled_chats[chat_id])
+            log_message = f"Enabled chat {chat_id} ({chat_name}) with alias {alias}, case {case}, language {language}{shard_note(chat_id)}"
             if case == '2':
                 log_message += " (Danger Mode)"
+            elif case == '3':
+                log_message += " (Lookahead Mode)"
             await safe_send_message(LOG_CHAT_ID, log_message)
         else:
-            await safe_send_message(LOG_CHAT_ID, f"Chat {chat_id} ({enabled_chats[chat_id]['name']}) is already enabled with alias {enabled_chats[chat_id]['alias']}, case {enabled_chats[chat_id]['case']}")
+            await safe_send_message(LOG_CHAT_ID, f"Chat {chat_id} ({enabled_chats[chat_id]['name']}) is already enabled with alias {enabled_chats[chat_id]['alias']}, case {enabled_chats[chat_id]['case']}, language {chat_language(chat_id)}")
     except (ValueError, pyrogram.errors.exceptions.bad_request_400.PeerIdInvalid):
-        await safe_send_message(LOG_CHAT_ID, f"Failed to enable chat: Invalid chat ID {message.command[1]}")
+        if handles_command(chat_id):
+            await safe_send_message(LOG_CHAT_ID, f"Failed to enable chat: Invalid chat ID {message.command[1]}")
 
 # Command handler: Disable chat
 @app.on_message(filters.command("off"))
@@ -302,22 +623,29 @@ async def disable_chat(client, message):
         print(f"Unauthorized /off attempt by user {message.from_user.id}")
         return
     if len(message.command) != 2:
-        await safe_send_message(LOG_CHAT_ID, "Usage: /off {chat_id}")
+        if handles_command():
+            await safe_send_message(LOG_CHAT_ID, "Usage: /off {chat_id}")
         return
     try:
         chat_id = int(message.command[1])
+        if not handles_command(chat_id):
+            return  # Another process plays this chat
         if chat_id in enabled_chats:
             alias = enabled_chats[chat_id]["alias"]
             name = enabled_chats[chat_id]["name"]
             case = enabled_chats[chat_id]["case"]
             enabled_chats.pop(chat_id)
-            used_words.pop(chat_id, None)
-            await save_config()
-            await safe_send_message(LOG_CHAT_ID, f"Disabled chat {chat_id} ({name}) with alias {alias}, case {case}")
+            refresh_game_chats()
+            reset_used_words(chat_id, disable=True)
+            turn_states.pop(chat_id, None)
+            drop_speculation(chat_id)
+            journal_for(chat_id).record('disable', chat_id)
+            await safe_send_message(LOG_CHAT_ID, f"Disabled chat {chat_id} ({name}) with alias {alias}, case {case}{shard_note(chat_id)}")
         else:
             await safe_send_message(LOG_CHAT_ID, f"Failed to disable chat {chat_id}: Not enabled")
     except ValueError:
-        await safe_send_message(LOG_CHAT_ID, f"Failed to disable chat: Invalid chat ID {message.command[1]}")
+        if handles_command():
+            await safe_send_message(LOG_CHAT_ID, f"Failed to disable chat: Invalid chat ID {message.command[1]}")
 
 # Command handler: Clear used words
 @app.on_message(filters.command("clear"))
@@ -326,18 +654,22 @@ async def clear_words(client, message):
         print(f"Unauthorized /clear attempt by user {message.from_user.id}")
         return
     if len(message.command) != 2:
-        await safe_send_message(LOG_CHAT_ID, "Usage: /clear {chat_id}")
+        if handles_command():
+            await safe_send_message(LOG_CHAT_ID, "Usage: /clear {chat_id}")
         return
     try:
         chat_id = int(message.command[1])
+        if not handles_command(chat_id):
+            return  # Another process plays this chat
         if chat_id in enabled_chats:
-            used_words[chat_id] = set()
-            await save_config()
+            reset_used_words(chat_id)
+            journal_for(chat_id).record('clear', chat_id)
             await safe_send_message(LOG_CHAT_ID, f"Cleared used words for chat {chat_id} ({enabled_chats[chat_id]['name']}) with alias {enabled_chats[chat_id]['alias']}, case {enabled_chats[chat_id]['case']}")
         else:
             await safe_send_message(LOG_CHAT_ID, f"Failed to clear words for chat {chat_id}: Not enabled")
     except ValueError:
-        await safe_send_message(LOG_CHAT_ID, f"Failed to clear words: Invalid chat ID {message.command[1]}")
+        if handles_command():
+            await safe_send_message(LOG_CHAT_ID, f"Failed to clear words: Invalid chat ID {message.command[1]}")
 
 # Command handler: Show enabled chats
 @app.on_message(filters.command("runs"))
@@ -345,86 +677,180 @@ async def show_enabled_chats(client, message):
     if message.from_user.id not in ADMIN_IDS:
         print(f"Unauthorized /runs attempt by user {message.from_user.id}")
         return
-    if enabled_chats:
+    # Every process writes out its pending changes; the coordinator then lists every shard's chats
+    for journal in config_journals.values():
+        await journal.flush()
+    if not handles_command():
+        return
+    chats = dict(enabled_chats)
+    if not coordinator.runs_all:
+        await asyncio.sleep(RUNS_WAIT)
+        try:
+            files = await read_config_files()
+        except Exception as e:
+            await safe_send_message(LOG_CHAT_ID, f"Failed to list enabled chats: {e}")
+            return
+        for shard in range(coordinator.shards):
+            config = files.get(config_files(shard)[0])
+            if shard in coordinator.local or config is None:
+                continue
+            for chat_id, record in config.chats.items():
+                if coordinator.shard_for(chat_id) == shard and not record.get('moved'):
+                    chats[chat_id] = record['info']
+    if chats:
         response = "Enabled chats:\n"
-        for chat_id, info in enabled_chats.items():
-            response += f"Chat ID: {chat_id}, Name: {info['name']}, Alias: {info['alias']}, Case: {info['case']}\n"
+        for chat_id, info in chats.items():
+            response += f"Chat ID: {chat_id}, Name: {info['name']}, Alias: {info['alias']}, Case: {info['case']}, Language: {info.get('language', DEFAULT_LANGUAGE)}"
+            response += f", Shard: {coordinator.shard_for(chat_id)}\n" if coordinator.shards > 1 else "\n"
         await safe_send_message(LOG_CHAT_ID, f"Listed enabled chats:\n{response}")
     else:
         await safe_send_message(LOG_CHAT_ID, "No chats are enabled")
 
+# Command handler: Review words rejected by the game bot
+@app.on_message(filters.command("rejections"))
+async def show_rejections(client, message):
+    if message.from_user.id not in ADMIN_IDS:
+        print(f"Unauthorized /rejections attempt by user {message.from_user.id}")
+        return
+    if not handles_command():
+        return
+    await rejection_store.flush()  # Pick up other processes' rejections first
+    if rejection_store.entries:
+        response = f"Rejected words ({rejection_store.excluded_count()} of {len(rejection_store)} excluded), most recent first:\n"
+        for word, entry in rejection_store.most_recent(REJECTIONS_LISTED):
+            status = "excluded" if rejection_store.is_excluded(word) else "allowed"
+            languages = ", ".join(entry.get('languages', [DEFAULT_LANGUAGE]))
+            response += f"{word} ({languages}): {sum(entry['chats'].values())} rejection(s) in {len(entry['chats'])} chat(s), confidence {rejection_store.confidence(entry):.2f}, {status}\n"
+        await safe_send_message(LOG_CHAT_ID, response)
+    else:
+        await safe_send_message(LOG_CHAT_ID, "No words have been rejected")
+
+# Command handler: Allow a rejected word again
+@app.on_message(filters.command("unban"))
+async def unban_word(client, message):
+    if message.from_user.id not in ADMIN_IDS:
+        print(f"Unauthorized /unban attempt by user {message.from_user.id}")
+        return
+    if len(message.command) != 2:
+        if handles_command():
+            await safe_send_message(LOG_CHAT_ID, "Usage: /unban {word}")
+        return
+    word = message.command[1].lower()
+    # Every process drops the exclusion; the coordinator answers
+    await rejection_store.flush()  # Know about other processes' rejections first
+    unbanned = rejection_store.unban(word)
+    if handles_command():
+        if unbanned:
+            await safe_send_message(LOG_CHAT_ID, f"Unbanned word '{word}' in all chats until it is rejected again")
+        else:
+            await safe_send_message(LOG_CHAT_ID, f"Failed to unban '{word}': Not excluded")
+
 # Game message handler
-@app.on_message(filters.text & filters.group)
+@app.on_message(game_filter.for_shard(coordinator.lead))
 async def handle_game_message(client, message):
+    # game_filter already checked the chat, sender and message shape
     chat_id = message.chat.id
     if chat_id not in enabled_chats:
         return
     
-    # Pattern for game prompt
-    prompt_pattern = r"Turn: X @ja \(Next: .+?\)\nYour word must start with (\w) and include at least (\d+) letters\."
-    # Pattern for invalid word reply
-    invalid_pattern = r"^(\w+) is not in my list of words\.$"
+    # Pattern for game prompt (the turn line names the account that plays this chat)
+    game_prompt = prompt_pattern(player_tag(chat_id))
     
-    if re.match(prompt_pattern, message.text, re.MULTILINE):
-        match = re.match(prompt_pattern, message.text, re.MULTILINE)
+    parse_started = time.perf_counter()
+    match = game_prompt.match(message.text) if message.text.startswith(PROMPT_PREFIX) else None
+    metrics.observe("ub_prompt_parse_seconds", time.perf_counter() - parse_started, **chat_labels(chat_id))
+    if match:
+        game_filter.learn(chat_id, message.from_user)
+        metrics.inc("ub_prompts_total", **chat_labels(chat_id))
         start_letter = match.group(1)
         min_length = int(match.group(2))
         case = enabled_chats[chat_id]['case']
+        state = turn_states[chat_id] = TurnState(start_letter, min_length)
+        scheduler_for(chat_id).new_prompt(chat_id)  # Words still queued for an older prompt are stale
         
-        # Send typing action for 3 seconds
+        # Send typing action, picking the word while "typing"
+        started = time.monotonic()
         try:
             await client.send_chat_action(chat_id, ChatAction.TYPING)
-            await asyncio.sleep(2)
         except Exception as e:
-            await safe_send_message(LOG_CHAT_ID, f"Error sending typing action to {chat_id}: {e}")
+            log_sink.log(f"Error sending typing action to {chat_id}: {e}")
         
-        # Get and send word
-        word = await get_game_word(start_letter, min_length, chat_id, case)
+        # Get and send word, starting from the move worked out during the previous turn if it fits
+        speculative = await take_speculation(chat_id, start_letter, min_length)
+        word = await get_game_word(start_letter, min_length, chat_id, case, PROMPT_TYPING_DELAY - LOOKAHEAD_MARGIN,
+                                   speculative[0] if speculative else None)
         if word:
-            await safe_send_message(chat_id, word, disable_notification=True)
+            if len(speculative) > 1:
+                state.backup = speculative[1]
+            else:
+                asyncio.ensure_future(prefetch_backup(chat_id, state, case))
+        await asyncio.sleep(max(0, PROMPT_TYPING_DELAY - (time.monotonic() - started)))
+        if word:
+            await safe_send_message(chat_id, word, PRIORITY_GAME, disable_notification=True)
         # No message sent to chat if no word is found
     
     elif message.reply_to_message and message.reply_to_message.id == last_bot_message_id.get(chat_id):
         # Check if message is a reply to bot's last word
-        invalid_match = re.match(invalid_pattern, message.text)
-        if invalid_match:
+        invalid_match = REJECTION_PATTERN.match(message.text)
+        if invalid_match and is_word(invalid_match.group(1)):
             invalid_word = invalid_match.group(1)
             # Add invalid word to used_words to avoid reuse
-            used_words[chat_id].add(invalid_word.lower())
-            await save_config()
-            await safe_send_message(LOG_CHAT_ID, f"Word '{invalid_word}' rejected in chat {chat_id} ({enabled_chats[chat_id]['name']}). Retrying...")
+            mark_word_used(chat_id, invalid_word)
+            metrics.inc("ub_rejections_total", **chat_labels(chat_id))
+            log_sink.log(f"Word '{invalid_word}' rejected in chat {chat_id} ({enabled_chats[chat_id]['name']}). Retrying...")
+            language = chat_language(chat_id)
+            if rejection_store.record(invalid_word, chat_id, language):
+                log_sink.log(f"Word '{invalid_word}' is now excluded in all {language} chats (see /rejections)")
             
-            # Get stored start_letter and min_length (assume from last prompt; you may need to store these)
-            # For simplicity, we'll need to re-fetch the prompt message to get start_letter and min_length
-            try:
-                # Fetch the prompt message (assuming it's recent; adjust logic if needed)
-                async for msg in app.get_chat_history(chat_id, limit=10):
-                    if re.match(prompt_pattern, msg.text, re.MULTILINE):
-                        match = re.match(prompt_pattern, msg.text, re.MULTILINE)
-                        start_letter = match.group(1)
-                        min_length = int(match.group(2))
-                        case = enabled_chats[chat_id]['case']
-                        break
-                else:
-                    await safe_send_message(LOG_CHAT_ID, f"Could not find recent prompt for retry in chat {chat_id}")
+            # Use the prompt we already parsed; fall back to chat history (e.g. after a restart)
+            state = turn_states.get(chat_id)
+            case = enabled_chats[chat_id]['case']
+            if state is None:
+                try:
+                    async for msg in client.get_chat_history(chat_id, limit=10):
+                        match = game_prompt.match(msg.text or "")
+                        if match:
+                            state = turn_states[chat_id] = TurnState(match.group(1), int(match.group(2)))
+                            break
+                    else:
+                        log_sink.log(f"Could not find recent prompt for retry in chat {chat_id}")
+                        return
+                except Exception as e:
+                    log_sink.log(f"Error fetching prompt for retry in chat {chat_id}: {e}")
                     return
-            except Exception as e:
-                await safe_send_message(LOG_CHAT_ID, f"Error fetching prompt for retry in chat {chat_id}: {e}")
-                return
+            start_letter = state.start_letter
+            min_length = state.min_length
+            backup, state.backup = state.backup, None
             
-            # Send typing action for 1 second
+            # Send typing action, picking the retry word while "typing"
+            started = time.monotonic()
             try:
                 await client.send_chat_action(chat_id, ChatAction.TYPING)
-                await asyncio.sleep(1.5)
             except Exception as e:
-                await safe_send_message(LOG_CHAT_ID, f"Error sending retry typing action to {chat_id}: {e}")
+                log_sink.log(f"Error sending retry typing action to {chat_id}: {e}")
             
             # Retry with same parameters
-            word = await get_game_word(start_letter, min_length, chat_id, case)
+            word = await get_game_word(start_letter, min_length, chat_id, case, RETRY_TYPING_DELAY - LOOKAHEAD_MARGIN, backup)
+            if word:
+                asyncio.ensure_future(prefetch_backup(chat_id, state, case))
+            await asyncio.sleep(max(0, RETRY_TYPING_DELAY - (time.monotonic() - started)))
             if word:
-                await safe_send_message(chat_id, word, disable_notification=True)
+                await safe_send_message(chat_id, word, PRIORITY_GAME, disable_notification=True)
             else:
-                await safe_send_message(LOG_CHAT_ID, f"No valid retry word found for '{start_letter}' with min length {min_length} in chat {chat_id}")
+                log_sink.log(f"No valid retry word found for '{start_letter}' with min length {min_length} in chat {chat_id}")
+    
+    elif message.text.startswith(PROMPT_PREFIX):
+        # Another player's turn
+        watch_turn(chat_id, message.text)
+    
+    elif chat_id in game_filter.watching:
+        # A word from the player before us
+        speculate_on(chat_id, message.from_user, message.text)
+
+# The other local accounts play their chats through the same handler
+for shard, shard_client in shard_clients.items():
+    if shard_client is not app:
+        shard_client.add_handler(MessageHandler(handle_game_message, game_filter.for_shard(shard)))
 
 # Startup handler using raw update
 @app.on_raw_update()
@@ -432,13 +858,31 @@ async def on_startup(client, update, users, chats):
     global INITIALIZED
     if not INITIALIZED:
         try:
+            log_sink.start()
             await load_config()
-            await safe_send_message(LOG_CHAT_ID, "Bot started successfully")
+            log_sink.log("Bot started successfully")
             INITIALIZED = True
         except Exception as e:
             print(f"Failed to initialize bot: {e}")
-            await safe_send_message(LOG_CHAT_ID, f"Failed to initialize bot: {e}")
+            log_sink.log(f"Failed to initialize bot: {e}")
+
+# Function to run every shard client until a stop signal, saving state while they can still send
+async def main():
+    started = []
+    try:
+        for shard_client in shard_clients.values():
+            await shard_client.start()
+            started.append(shard_client)
+        await idle()
+        await save_config()  # Fold the journal into a snapshot on shutdown
+        await rejection_store.flush()
+        await log_sink.flush()  # The send schedulers still have connected clients here
+    finally:
+        for shard_client in reversed(started):
+            await shard_client.stop()
 
 # Run the bot
 if __name__ == "__main__":
-    app.run()
+    if METRICS_PORT:
+        serve_metrics(metrics, METRICS_HOST, METRICS_PORT + coordinator.lead)  # One port per shard process
+    app.run(main())
@@ -0,0 +1,204 @@
+"""
+Offline prompt-replay benchmark for the game handler.
+
+    python -m ub.benchmark [--chats 50] [--prompts 100] [--cases 1,2,3] [--reject 0.1] [--language en] [--no-memory]
+
+Replays synthetic game transcripts (prompts, and "not in my list of words"
+rejections of our replies) across many chats through the game filter and
+handle_game_message,
+with FakeClient standing in for the Telegram client. For each case it reports
+selection latency (get_game_word) percentiles, throughput in prompts per
+second, and memory growth as the chats' used words fill up. Latency and
+throughput come from a pass with tracemalloc off, since tracing slows every
+allocation; memory growth comes from a second, untimed replay of the same
+transcripts under tracemalloc. Nothing touches the network; config journal
+writes go to a temporary directory.
+"""
+import argparse
+import asyncio
+import importlib
+import itertools
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+from pyrogram.enums import ChatType
+
+PROMPT_TEMPLATE = "Turn: X @ja (Next: Y)\nYour word must start with {letter} and include at least {min_length} letters."
+REJECT_TEMPLATE = "{word} is not in my list of words."
+BENCH_CHAT_BASE = -1001000000000
+
+
+class FakeClient:
+    """Stands in for pyrogram.Client, recording what the bot does."""
+
+    def __init__(self):
+        self.sent: List[Tuple[int, str, dict]] = []
+        self.chat_actions: List[Tuple[int, object]] = []
+        self.history_calls = 0
+        self.history: Dict[int, List[SimpleNamespace]] = {}  # chat_id -> messages, newest last
+        self._message_ids = itertools.count(1)
+
+    def message(self, chat_id: int, text: str, reply_to: Optional[SimpleNamespace] = None) -> SimpleNamespace:
+        message = SimpleNamespace(
+            id=next(self._message_ids), chat=SimpleNamespace(id=chat_id, type=ChatType.SUPERGROUP), text=text,
+            reply_to_message=reply_to, from_user=SimpleNamespace(id=0, is_bot=True),
+        )
+        self.history.setdefault(chat_id, []).append(message)
+        return message
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> SimpleNamespace:
+        self.sent.append((chat_id, text, kwargs))
+        return self.message(chat_id, text)
+
+    async def send_chat_action(self, chat_id: int, action):
+        self.chat_actions.append((chat_id, action))
+
+    async def get_chat_history(self, chat_id: int, limit: int = 0):
+        self.history_calls += 1
+        for message in reversed(self.history.get(chat_id, [])[-limit:]):
+            yield message
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def dispatch(bot, client: FakeClient, message: SimpleNamespace):
+    """Deliver a message the way Pyrogram would: through the game filter, then the handler."""
+    if bot.game_filter.check(bot.coordinator.lead, message):
+        await bot.handle_game_message(client, message)
+
+
+async def replay_chat(bot, client: FakeClient, chat_id: int, prompts: int, reject: float,
+                      letters: List[str], weights: List[int], rng: random.Random):
+    """One chat's transcript: prompts on letters weighted like the dictionary, some replies rejected."""
+    for turn in range(prompts):
+        letter = rng.choices(letters, weights)[0]
+        min_length = rng.randint(3, 3 + turn * 6 // max(prompts, 1))
+        await dispatch(bot, client, client.message(chat_id, PROMPT_TEMPLATE.format(letter=letter, min_length=min_length)))
+        while rng.random() < reject:
+            ours = bot.last_bot_message_id.get(chat_id)
+            reply = next((m for m in reversed(client.history[chat_id]) if m.id == ours), None)
+            if reply is None:
+                break
+            await dispatch(bot, client, client.message(chat_id, REJECT_TEMPLATE.format(word=reply.text), reply))
+
+
+async def run_case(bot, case: str, chats: int, prompts: int, reject: float, seed: int, language: str,
+                   trace: bool = False) -> dict:
+    """Replay one case. With trace, memory growth is measured under tracemalloc and the timings are not reliable."""
+    client = FakeClient()
+    bot.app = bot.shard_clients[bot.coordinator.lead] = client
+    latencies: List[float] = []
+    original = bot.get_game_word
+
+    async def timed_get_game_word(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await original(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    bot.get_game_word = timed_get_game_word
+    chat_ids = [BENCH_CHAT_BASE - i for i in range(chats)]
+    for chat_id in chat_ids:
+        bot.enabled_chats[chat_id] = {"alias": "0000", "name": f"bench {chat_id}", "case": case, "language": language}
+        bot.reset_used_words(chat_id)
+    bot.refresh_game_chats()
+
+    index = bot.get_word_index(language)
+    bot.rejection_store.entries.clear()  # Each case starts without learned rejections
+    bot.rejection_store.bind(bot.get_word_index)
+    letters = sorted(index.letter_counts)
+    weights = [index.letter_counts[letter] for letter in letters]
+    rng = random.Random(seed)
+    memory_before = memory_after = 0
+    if trace:
+        tracemalloc.start()
+        memory_before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            replay_chat(bot, client, chat_id, prompts, reject, letters, weights, random.Random(rng.random()))
+            for chat_id in chat_ids
+        ))
+        elapsed = time.perf_counter() - started
+        if trace:
+            memory_after = tracemalloc.get_traced_memory()[0]
+    finally:
+        if trace:
+            tracemalloc.stop()
+        bot.get_game_word = original
+
+    used = [bot.used_words[chat_id] for chat_id in chat_ids]
+    result = {
+        "case": case,
+        "prompts": chats * prompts,
+        "selections": len(latencies),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": max(latencies, default=0.0) * 1000,
+        "prompts_per_s": chats * prompts / elapsed if elapsed else 0.0,
+        "used_words": sum(len(chat_used) for chat_used in used),
+        "used_bytes": sum(chat_used.nbytes() for chat_used in used),
+        "memory_kb": (memory_after - memory_before) / 1024,
+        "history_calls": client.history_calls,
+    }
+    for chat_id in chat_ids:
+        bot.enabled_chats.pop(chat_id, None)
+        bot.reset_used_words(chat_id, disable=True)
+        bot.turn_states.pop(chat_id, None)
+    bot.refresh_game_chats()
+    return result
+
+
+async def main(args):
+    bot = importlib.import_module("ub.__main__")
+    bot.init_worker((args.language,))  # Index built (and saved) next to the default dictionary on first use
+    os.chdir(tempfile.mkdtemp(prefix="ub-bench-"))  # Journal and snapshot writes land here
+    bot.PROMPT_TYPING_DELAY = bot.RETRY_TYPING_DELAY = args.typing_delay
+    bot.LOOKAHEAD_MARGIN = 0.0  # Case 3 searches for the whole typing delay
+    if not args.throttled:
+        bot.send_scheduler.global_bucket.rate = bot.send_scheduler.global_bucket.capacity = float("inf")
+        bot.send_scheduler.chat_rate = bot.send_scheduler.chat_burst = float("inf")
+    bot.log_sink.interval = 0.5
+    bot.log_sink.start()
+
+    print(f"{'case':>4} {'prompts':>8} {'select':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+          f"{'prompt/s':>9} {'used':>7} {'used KB':>8} {'mem KB':>8} {'history':>7}")
+    for case in args.cases.split(","):
+        r = await run_case(bot, case.strip(), args.chats, args.prompts, args.reject, args.seed, args.language)
+        if args.memory:
+            traced = await run_case(bot, case.strip(), args.chats, args.prompts, args.reject, args.seed, args.language,
+                                    trace=True)
+            r["memory_kb"] = traced["memory_kb"]
+        print(f"{r['case']:>4} {r['prompts']:>8} {r['selections']:>7} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+              f"{r['max_ms']:>8.2f} {r['prompts_per_s']:>9.1f} {r['used_words']:>7} {r['used_bytes'] / 1024:>8.1f} "
+              f"{r['memory_kb'] if args.memory else float('nan'):>8.1f} {r['history_calls']:>7}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--prompts", type=int, default=100, help="prompts per chat")
+    parser.add_argument("--cases", default="1,2", help="comma-separated game cases to compare")
+    parser.add_argument("--reject", type=float, default=0.1, help="chance that a reply gets rejected")
+    parser.add_argument("--typing-delay", type=float, default=0.0, help="typing delay in seconds (Case 3 search budget)")
+    parser.add_argument("--throttled", action="store_true", help="keep the send scheduler's rate limits")
+    parser.add_argument("--language", default="en", help="game language (wordfreq language code)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="skip the tracemalloc pass that measures memory growth")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,37 @@
+"""
+Compile the wordfreq and NLTK vocabularies into a prebuilt word index file.
+
+    python -m ub.build_dictionary [path] [--language en]
+
+The bot maps the file (default: dictionary.bin in the working directory, or
+dictionary.<language>.bin for other languages) at startup instead of parsing
+the corpora, so run this again after upgrading wordfreq or NLTK data. A file
+with different words is kept as <path>.<old fingerprint> so the bot can map
+used words saved against it; delete it once every shard has restarted.
+"""
+import argparse
+import os
+import time
+
+from .word_index import WordIndex, DEFAULT_LANGUAGE, dictionary_file, replaced_dictionary_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("path", nargs="?", help="output file (default depends on the language)")
+    parser.add_argument("--language", default=DEFAULT_LANGUAGE, help="wordfreq language code")
+    args = parser.parse_args()
+    path = args.path or dictionary_file(args.language)
+    started = time.monotonic()
+    index = WordIndex.build(args.language)
+    if os.path.exists(path):
+        previous = WordIndex.load(path).fingerprint
+        if previous != index.fingerprint:
+            os.replace(path, replaced_dictionary_file(path, previous))
+            print(f"Kept the previous index as {replaced_dictionary_file(path, previous)}")
+    index.save(path)
+    print(f"Wrote {len(index)} {args.language} words to {path} in {time.monotonic() - started:.1f}s (fingerprint {index.fingerprint})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .word_index import WordIndex, SOURCE_WORDFREQ
+from .used_words import UsedBitset
+
+
+class ContinuationTable:
+    """
+    Live-reply counts for Case 2 ("danger mode").
+
+    counts[letter, n] is the number of dictionary words that start with letter
+    and have at least n letters, i.e. how many replies the opponent has when the
+    next prompt asks for that letter and length. Each chat gets a copy of the
+    table (its overlay) that is decremented as words are used there, so ranking a
+    move is a table lookup rather than a scan of the word list.
+    """
+
+    def __init__(self, index: WordIndex):
+        self.index = index
+        first_codes = np.frombuffer(index.first_codes, dtype=np.uintc)
+        last_codes = np.frombuffer(index.last_codes, dtype=np.uintc)
+        codes = np.unique(np.concatenate((first_codes, last_codes)))
+        self.alphabet = [chr(code) for code in codes]
+        self.letter_ids = {letter: i for i, letter in enumerate(self.alphabet)}
+        self.first = np.searchsorted(codes, first_codes)
+        self.last = np.searchsorted(codes, last_codes)
+        self.lengths = np.frombuffer(index.word_lengths, dtype=np.uint16).astype(np.intp)
+        self.max_length = int(self.lengths.max()) if len(index) else 0
+        self.counts = self._at_least(np.arange(len(index)))
+        self._overlays: Dict[int, np.ndarray] = {}  # chat_id -> live counts
+        self._groups: Dict[Tuple[str, str], Tuple[np.ndarray, ...]] = {}  # (source, letter) -> candidate arrays
+
+    def _at_least(self, word_ids: np.ndarray) -> np.ndarray:
+        """Table of how many of word_ids start with each letter and have at least n letters."""
+        histogram = np.zeros((len(self.alphabet), self.max_length + 2), dtype=np.int32)
+        np.add.at(histogram, (self.first[word_ids], self.lengths[word_ids]), 1)
+        return np.cumsum(histogram[:, ::-1], axis=1)[:, ::-1]
+
+    def used_mask(self, used: UsedBitset, word_ids: np.ndarray) -> np.ndarray:
+        bits = np.unpackbits(np.frombuffer(used.bits, dtype=np.uint8), bitorder='little')
+        mask = np.zeros(len(word_ids), dtype=bool)
+        inside = word_ids < len(bits)
+        mask[inside] = bits[word_ids[inside]].astype(bool)
+        return mask
+
+    def live_counts(self, used: UsedBitset) -> np.ndarray:
+        """counts minus the words in used."""
+        all_ids = np.arange(len(self.index))
+        return self.counts - self._at_least(all_ids[self.used_mask(used, all_ids)])
+
+    def overlay(self, chat_id: int, used: UsedBitset) -> np.ndarray:
+        """Live counts for a chat, built from its used words on first use."""
+        live = self._overlays.get(chat_id)
+        if live is None:
+            live = self._overlays[chat_id] = self.live_counts(used)
+        return live
+
+    def use(self, chat_id: int, word_id: int):
+        """Account for a newly used word in the chat's overlay, if it has one."""
+        live = self._overlays.get(chat_id)
+        if live is not None:
+            self.discount(live, word_id)
+
+    def discount(self, live: np.ndarray, word_id: int):
+        """Take word_id out of the live counts in live."""
+        live[self.first[word_id], :self.lengths[word_id] + 1] -= 1
+
+    def reset(self, chat_id: int):
+        self._overlays.pop(chat_id, None)
+
+    def reset_all(self):
+        """Drop every overlay; each is rebuilt from its chat's used words on next use."""
+        self._overlays.clear()
+
+    def _group(self, source: str, letter: str) -> Optional[Tuple[np.ndarray, ...]]:
+        key = (source, letter)
+        group = self._groups.get(key)
+        if group is None:
+            entries = self.index.entries(source, letter)
+            if not entries:
+                return None
+            word_ids = np.frombuffer(entries, dtype=np.uintc).astype(np.intp)
+            group = (word_ids, self.lengths[word_ids], self.last[word_ids],
+                     np.frombuffer(self.index.frequencies, dtype=np.float64)[word_ids])
+            self._groups[key] = group
+        return group
+
+    def best_move(self, used: UsedBitset, source: str, letter: str, min_length: int,
+                  live: Optional[np.ndarray] = None) -> Optional[Tuple[int, int]]:
+        """
+        Unused word from source starting with letter that leaves the fewest live replies.
+        live is the chat's overlay, computed from used if not given. The next prompt's
+        length requirement is assumed to be min_length again. Ties go to the lowest
+        wordfreq frequency (wordfreq only), then selection order.
+        Returns (word ID, live replies) or None.
+        """
+        letter = letter.lower()
+        group = self._group(source, letter)
+        if group is None:
+            return None
+        word_ids, lengths, lasts, frequencies = group
+        positions = np.flatnonzero((lengths >= min_length) & ~self.used_mask(used, word_ids))
+        if not len(positions):
+            return None
+        if live is None:
+            live = self.live_counts(used)
+        column = min(min_length, live.shape[1] - 1)
+        # The move itself stops being a reply if it also starts with its last letter
+        replies = live[lasts[positions], column] - (lasts[positions] == self.letter_ids[letter])
+        if source == SOURCE_WORDFREQ:
+            order = np.lexsort((positions, frequencies[positions], replies))
+        else:
+            order = np.lexsort((positions, replies))
+        return int(word_ids[positions[order[0]]]), int(replies[order[0]])
@@ -0,0 +1,101 @@
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Pattern, Set
+
+from pyrogram import filters
+from pyrogram.enums import ChatType
+
+from .word_index import is_word
+
+# Literal parts of game messages, checked before any regex runs
+PROMPT_PREFIX = "Turn: "
+REJECTION_SUFFIX = " is not in my list of words."
+
+# Start letters are Unicode letters (\w without digits and underscore). A rejected word may also hold
+# combining marks, which \w does not match, so it is taken whole here and checked with is_word
+REJECTION_PATTERN = re.compile(r"^(\S+) is not in my list of words\.$")
+# Any player's prompt: (player, next player, start letter, min length)
+ANY_PROMPT_PATTERN = re.compile(
+    r"Turn: (.+?) \(Next: (.+?)\)\nYour word must start with ([^\W\d_]) and include at least (\d+) letters\.",
+    re.MULTILINE
+)
+GROUP_TYPES = frozenset((ChatType.GROUP, ChatType.SUPERGROUP))
+
+
+# Function to get the compiled prompt pattern for a player's turn line
+@lru_cache(maxsize=64)
+def prompt_pattern(player_tag: str) -> Pattern:
+    return re.compile(
+        r"Turn: " + re.escape(player_tag) + r" \(Next: .+?\)\nYour word must start with ([^\W\d_]) and include at least (\d+) letters\.",
+        re.MULTILINE
+    )
+
+
+class GameFilter:
+    """
+    Pre-dispatch filter that lets through only messages the game handler acts on.
+
+    Runs for every text message in every group the accounts are in, so it
+    does no more than set lookups and string prefix/suffix checks: the chat
+    must be enabled and played by the receiving shard (a frozenset per shard,
+    rebuilt by compile() whenever the enabled chats change), the text must
+    look like a prompt or a rejection reply, and the sender must be the game
+    bot. The game bot is bot_ids if given, otherwise the first bot seen
+    sending a prompt in each chat (see learn()). In chats being watched
+    (the player before us is answering, see watch()), single words from
+    people pass too.
+    """
+
+    def __init__(self, bot_ids: Iterable[int] = ()):
+        self.bot_ids: FrozenSet[int] = frozenset(bot_ids)
+        self.learned: Dict[int, int] = {}  # chat_id -> game bot user ID, when bot_ids is empty
+        self.chats: Dict[int, FrozenSet[int]] = {}  # shard -> enabled chat IDs it plays
+        self.watching: Set[int] = set()  # Chats where the player before us is answering
+        self.passed = 0  # Messages let through since startup
+        self.dropped = 0  # Messages from enabled chats dropped since startup
+
+    def compile(self, chats_by_shard: Dict[int, Iterable[int]]):
+        self.chats = {shard: frozenset(chat_ids) for shard, chat_ids in chats_by_shard.items()}
+
+    def watch(self, chat_id: int):
+        self.watching.add(chat_id)
+
+    def unwatch(self, chat_id: int):
+        self.watching.discard(chat_id)
+
+    def learn(self, chat_id: int, user):
+        """Remember the sender of a prompt that matched in chat_id as its game bot."""
+        if not self.bot_ids and user is not None and user.is_bot and chat_id not in self.learned:
+            self.learned[chat_id] = user.id
+
+    def _from_game_bot(self, chat_id: int, user) -> bool:
+        if user is None:
+            return False
+        if self.bot_ids:
+            return user.id in self.bot_ids
+        known = self.learned.get(chat_id)
+        return known is None or known == user.id
+
+    def check(self, shard: int, message) -> bool:
+        chat = message.chat
+        if chat is None or chat.id not in self.chats.get(shard, ()):
+            return False
+        text = message.text
+        if (text and chat.type in GROUP_TYPES
+                and (text.startswith(PROMPT_PREFIX)
+                     or (message.reply_to_message is not None and text.endswith(REJECTION_SUFFIX)))
+                and self._from_game_bot(chat.id, message.from_user)):
+            self.passed += 1
+            return True
+        if (text and chat.id in self.watching and is_word(text)
+                and message.from_user is not None and not message.from_user.is_bot):
+            self.passed += 1
+            return True
+        self.dropped += 1
+        return False
+
+    def for_shard(self, shard: int) -> filters.Filter:
+        """Pyrogram filter for the client of shard. Async, so Pyrogram calls it inline instead of in its thread pool."""
+        async def check(flt, client, message) -> bool:
+            return self.check(shard, message)
+        return filters.create(check, f"GameFilter{shard}")
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import aiofiles
+
+from .word_index import DEFAULT_LANGUAGE
+
+
+class ConfigFile(NamedTuple):
+    """What one config file (snapshot plus journal) says about its chats."""
+    written: float  # Last write to the snapshot or the journal (0 if neither exists)
+    chats: Dict[int, dict]  # See replay_chats
+    imported: Dict[int, float]  # chat_id -> when this file's shard took the chat over from another file
+
+
+async def read_files(snapshot_path: str, journal_path: str) -> Tuple[dict, List[dict]]:
+    """Read a snapshot and the journaled events recorded after it."""
+    data = {}
+    if os.path.exists(snapshot_path):
+        async with aiofiles.open(snapshot_path, 'r') as f:
+            data = json.loads(await f.read())
+    events = []
+    if os.path.exists(journal_path):
+        async with aiofiles.open(journal_path, 'r') as f:
+            for line in (await f.read()).splitlines():
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue  # Torn write from a crash
+    return data, events
+
+
+def replay_chats(data: dict, events: List[dict]) -> Dict[int, dict]:
+    """
+    The chats of a snapshot plus journal, without loading any word index.
+
+    Each chat maps to {info, used, index, words}: its enabled_chats entry,
+    its used words as saved (None if none were), the fingerprint of the
+    index they were saved against, and the words journaled since. Chats the
+    file keeps for another shard (moved_chats) are included with moved set.
+    """
+    fingerprints = data.get('used_words_index') or {}
+    if isinstance(fingerprints, str):
+        fingerprints = {DEFAULT_LANGUAGE: fingerprints}  # Saved before chats had languages
+    chats = {}
+    for chat_id, record in (data.get('moved_chats') or {}).items():
+        chats[int(chat_id)] = dict(record, words=list(record.get('words', [])), moved=True)
+    used = data.get('used_words') or {}
+    for chat_id, info in (data.get('enabled_chats') or {}).items():
+        chats[int(chat_id)] = {'info': info, 'used': used.get(chat_id),
+                               'index': fingerprints.get(info.get('language', DEFAULT_LANGUAGE)), 'words': []}
+    for event in events:
+        chat_id = event['chat']
+        if event['op'] == 'enable':
+            chats[chat_id] = {'info': event['info'], 'used': None, 'index': None, 'words': []}
+        elif event['op'] == 'disable':
+            chats.pop(chat_id, None)
+        elif chat_id not in chats:
+            continue
+        elif event['op'] == 'use':
+            chats[chat_id]['words'].append(event['word'])
+        elif event['op'] == 'clear':
+            chats[chat_id].update(used=None, index=None, words=[])
+    return chats
+
+
+async def read_config(snapshot_path: str, journal_path: str) -> ConfigFile:
+    """Read another (or this) process's config file without taking it over."""
+    data, events = await read_files(snapshot_path, journal_path)
+    written = max((os.path.getmtime(path) for path in (snapshot_path, journal_path) if os.path.exists(path)), default=0.0)
+    imported = {int(chat_id): at for chat_id, at in (data.get('imported_chats') or {}).items()}
+    return ConfigFile(written, replay_chats(data, events), imported)
+
+
+class ConfigJournal:
+    """
+    Append-only event journal on top of a JSON snapshot.
+
+    State changes are recorded as small JSON events ("enable", "disable", "use",
+    "clear") and appended to the journal in batches, flush_delay seconds after the
+    first unflushed event, so callers never wait on disk. Once the journal holds
+    compact_every events it is folded into a fresh snapshot, written to a
+    temporary file and moved into place so a crash never leaves a half-written
+    snapshot. Replaying the journal over the snapshot restores the latest state;
+    replaying it over a newer snapshot (crash between snapshot and truncate)
+    gives the same result, since the events only re-apply what the snapshot
+    already contains.
+    """
+
+    def __init__(self, snapshot_path: str, journal_path: str,
+                 snapshot: Callable[[], dict],
+                 on_error: Optional[Callable[[Exception], Awaitable]] = None,
+                 flush_delay: float = 1.0, compact_every: int = 5000,
+                 on_write: Optional[Callable[[str, float], None]] = None):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.snapshot = snapshot  # Returns the full state to write on compaction
+        self.on_error = on_error
+        self.flush_delay = flush_delay
+        self.compact_every = compact_every
+        self.on_write = on_write  # Called with ("flush" or "compact", seconds) after each write
+        self.journal_size = 0  # Events currently in the journal file
+        self._pending: List[str] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._lock = asyncio.Lock()
+
+    async def load(self) -> Tuple[dict, List[dict]]:
+        """Read the snapshot and the journaled events recorded after it."""
+        data, events = await read_files(self.snapshot_path, self.journal_path)
+        self.journal_size = len(events)
+        return data, events
+
+    def record(self, op: str, chat_id: int, **fields):
+        """Queue an event; it is written on the next batched flush."""
+        self._pending.append(json.dumps({"op": op, "chat": chat_id, **fields}))
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.flush_delay, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_handle = None
+        asyncio.ensure_future(self.flush())
+
+    async def flush(self):
+        """Append pending events to the journal, compacting it when it grows too long."""
+        async with self._lock:
+            if not self._pending:
+                return
+            lines, self._pending = self._pending, []
+            started = time.perf_counter()
+            try:
+                async with aiofiles.open(self.journal_path, 'a') as f:
+                    await f.write("".join(line + "\n" for line in lines))
+                self.journal_size += len(lines)
+                self._written("flush", started)
+            except Exception as e:
+                self._pending[:0] = lines  # Keep them for the next flush
+                await self._report(e)
+                return
+        if self.journal_size >= self.compact_every:
+            await self.compact()
+
+    async def compact(self):
+        """Write the current state as a new snapshot and empty the journal."""
+        async with self._lock:
+            started = time.perf_counter()
+            data = self.snapshot()
+            covered = len(self._pending)  # Events already reflected in data
+            try:
+                tmp_path = self.snapshot_path + ".tmp"
+                async with aiofiles.open(tmp_path, 'w') as f:
+                    await f.write(json.dumps(data))
+                os.replace(tmp_path, self.snapshot_path)
+                async with aiofiles.open(self.journal_path, 'w'):
+                    pass
+                self.journal_size = 0
+                del self._pending[:covered]
+                self._written("compact", started)
+            except Exception as e:
+                await self._report(e)
+
+    def _written(self, kind: str, started: float):
+        if self.on_write is not None:
+            self.on_write(kind, time.perf_counter() - started)
+
+    async def _report(self, error: Exception):
+        if self.on_error is not None:
+            await self.on_error(error)
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Optional
+
+
+class LogSink:
+    """
+    Batched, rate-limited delivery of log entries to the log chat.
+
+    log() only appends to an in-memory queue, so callers never wait on
+    Telegram. Every interval seconds the queue is coalesced into digest
+    messages, at most max_messages per interval, which is the sink's whole send
+    budget. The queue holds at most max_entries. Entries that do not fit, and
+    digests that fail to send, go to the local logger (bot.log) instead, and
+    the next digest says how many entries were dropped.
+    """
+
+    def __init__(self, send: Callable[[str], Awaitable], interval: float = 5.0,
+                 max_entries: int = 1000, max_messages: int = 2, max_length: int = 4096,
+                 fallback: Optional[logging.Logger] = None):
+        self.send = send
+        self.interval = interval
+        self.max_entries = max_entries
+        self.max_messages = max_messages
+        self.max_length = max_length  # Telegram's message size limit
+        self.fallback = fallback or logging.getLogger(__name__)
+        self.dropped = 0  # Entries dropped on overflow since startup
+        self.failed = 0  # Digests that could not be delivered since startup
+        self._unreported = 0  # Dropped entries not yet mentioned in a digest
+        self._entries: Deque[str] = deque()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def log(self, text: str):
+        """Queue an entry for the next digest."""
+        if len(self._entries) >= self.max_entries:
+            self.dropped += 1
+            self._unreported += 1
+            self.fallback.info(text)
+            return
+        self._entries.append(f"{time.strftime('%H:%M:%S')} {text}"[:self.max_length])
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def _digest(self) -> str:
+        lines = []
+        size = 0
+        if self._unreported:
+            lines.append(f"({self._unreported} log entries dropped, see bot.log)")
+            size = len(lines[0])
+            self._unreported = 0
+        while self._entries and (not lines or size + 1 + len(self._entries[0]) <= self.max_length):
+            entry = self._entries.popleft()
+            lines.append(entry)
+            size += 1 + len(entry)
+        return "\n".join(lines)
+
+    async def flush(self):
+        """Send up to max_messages digests; the rest waits for the next interval."""
+        for _ in range(self.max_messages):
+            if not self._entries and not self._unreported:
+                return
+            text = self._digest()
+            try:
+                await self.send(text)
+            except Exception as e:
+                self.failed += 1
+                self.fallback.warning(f"Failed to deliver log digest: {e}\n{text}")
@@ -0,0 +1,118 @@
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .continuations import ContinuationTable
+from .used_words import UsedBitset
+
+WIN = 10 ** 6  # Score of a forced win; mobility scores stay far below this
+MAX_DEPTH = 64
+
+
+class _Timeout(Exception):
+    pass
+
+
+class LookaheadEngine:
+    """
+    Time-budgeted minimax over the word chain (Case 3).
+
+    Words are reduced to their first and last letters: moves[s][e] counts live
+    words that start with s, end with e and meet min_length. Playing one uses it
+    up and hands the opponent letter e, and a player left with no live words
+    loses. The search is an iterative-deepening negamax with alpha-beta pruning.
+    At the deadline it returns the best move of the deepest completed pass.
+    Leaves are scored by the mobility of the side to move, so a depth-1 search
+    ranks moves like Case 2 does.
+    """
+
+    def __init__(self, table: ContinuationTable, check_every: int = 256):
+        self.table = table
+        self.check_every = check_every  # Nodes between deadline checks
+        self._deadline = 0.0
+        self._nodes = 0
+
+    def moves(self, used: UsedBitset, min_length: int) -> List[List[int]]:
+        """moves[s][e]: live words starting with letter s and ending with letter e."""
+        table = self.table
+        all_ids = np.arange(len(table.index))
+        live = (table.lengths >= min_length) & ~table.used_mask(used, all_ids)
+        size = len(table.alphabet)
+        pairs = table.first[live] * size + table.last[live]
+        return np.bincount(pairs, minlength=size * size).reshape(size, size).tolist()
+
+    def search(self, used: UsedBitset, letter: str, min_length: int,
+               budget: float) -> Optional[Tuple[str, int, int]]:
+        """
+        Best ending letter for a word starting with letter, within budget seconds.
+        The next prompts are assumed to keep the same min_length.
+        Returns (ending letter, score, completed depth) or None if there is no move.
+        """
+        start = self.table.letter_ids.get(letter.lower())
+        if start is None:
+            return None
+        self._deadline = time.monotonic() + budget
+        self._nodes = 0
+        moves = self.moves(used, min_length)
+        totals = [sum(row) for row in moves]
+        order = self._order(moves, totals, start)
+        if not order:
+            return None
+
+        best = (order[0], -totals[order[0]], 0)
+        try:
+            for depth in range(1, MAX_DEPTH + 1):
+                alpha = -WIN * 2
+                best_end = order[0]
+                for end in order:
+                    self._play(moves, totals, start, end, -1)
+                    score = -self._negamax(moves, totals, end, depth - 1, -WIN * 2, -alpha)
+                    self._play(moves, totals, start, end, 1)
+                    if score > alpha:
+                        alpha, best_end = score, end
+                best = (best_end, alpha, depth)
+                if abs(alpha) >= WIN:
+                    break  # Forced result, deeper search cannot change it
+                order.remove(best_end)
+                order.insert(0, best_end)
+        except _Timeout:
+            pass
+        end, score, depth = best
+        return self.table.alphabet[end], score, depth
+
+    def _negamax(self, moves: List[List[int]], totals: List[int], letter: int,
+                 depth: int, alpha: int, beta: int) -> int:
+        """Score for the side that has to play a word starting with letter."""
+        if not totals[letter]:
+            return -WIN - depth  # Losing later is better than losing now
+        if depth == 0:
+            return totals[letter]
+        self._nodes += 1
+        if self._nodes % self.check_every == 0 and time.monotonic() >= self._deadline:
+            raise _Timeout()
+        best = -WIN * 2
+        for end in self._order(moves, totals, letter):
+            self._play(moves, totals, letter, end, -1)
+            score = -self._negamax(moves, totals, end, depth - 1, -beta, -alpha)
+            self._play(moves, totals, letter, end, 1)
+            if score > best:
+                best = score
+                if best > alpha:
+                    alpha = best
+                    if alpha >= beta:
+                        break
+        return best
+
+    @staticmethod
+    def _play(moves: List[List[int]], totals: List[int], start: int, end: int, delta: int):
+        moves[start][end] += delta
+        totals[start] += delta
+
+    @staticmethod
+    def _order(moves: List[List[int]], totals: List[int], letter: int) -> List[int]:
+        """Ending letters playable from letter, fewest opponent replies first."""
+        row = moves[letter]
+        ends = [end for end in range(len(row)) if row[end]]
+        ends.sort(key=lambda end: totals[end] - (end == letter))
+        return ends
@@ -0,0 +1,140 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+# Histogram bucket upper bounds in seconds, from regex parses to FloodWait-delayed sends
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+# A collector yields (metric name, labels, value) for values read at scrape time
+Collector = Callable[[], Iterable[Tuple[str, Dict[str, object], float]]]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = ['%s="%s"' % (key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+             for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size  # Per bucket, not cumulative
+        self.sum = 0.0
+        self.count = 0
+
+
+class Metrics:
+    """
+    In-process counters and latency histograms, rendered in the Prometheus
+    text format.
+
+    observe() and inc() are called from the event loop; render() runs on the
+    metrics server thread, so both sides take a lock that is only held for a
+    dictionary update. Gauges (queue depths, used-word counts) are not stored
+    but read from collectors when rendering.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.bucket_labels = ['le="%s"' % bound for bound in buckets] + ['le="+Inf"']
+        self._lock = threading.Lock()
+        self._descriptions: Dict[str, Tuple[str, str]] = {}  # name -> (type, help)
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._collectors: List[Collector] = []
+
+    def describe(self, name: str, kind: str, help_text: str):
+        """Declare a metric; kind is "histogram", "counter" or "gauge"."""
+        self._descriptions[name] = (kind, help_text)
+
+    def add_collector(self, collector: Collector):
+        self._collectors.append(collector)
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = _labels(labels)
+        bucket = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(len(self.buckets) + 1)
+            histogram.counts[bucket] += 1
+            histogram.sum += seconds
+            histogram.count += 1
+
+    def inc(self, name: str, amount: float = 1.0, **labels):
+        key = _labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """Observe the time spent in the with block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def render(self) -> str:
+        samples: Dict[str, List[str]] = {}
+        with self._lock:
+            for name, series in self._histograms.items():
+                lines = samples.setdefault(name, [])
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(self.bucket_labels, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, bound)} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {_format_value(histogram.sum)}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+            for name, series in self._counters.items():
+                samples.setdefault(name, []).extend(
+                    f"{name}{_format_labels(key)} {_format_value(value)}" for key, value in series.items()
+                )
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                samples.setdefault(name, []).append(f"{name}{_format_labels(_labels(labels))} {_format_value(value)}")
+
+        out = []
+        for name in sorted(samples):
+            kind, help_text = self._descriptions.get(name, ("untyped", ""))
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(samples[name])
+        return "\n".join(out) + "\n"
+
+
+def serve(metrics: Metrics, host: str = "127.0.0.1", port: int = 9100):
+    """Serve metrics.render() at http://host:port/metrics from a daemon thread. Returns the server."""
+    # Imported here so the bot (and the benchmark) run without Flask when metrics are off
+    from flask import Flask, Response
+    from werkzeug.serving import make_server
+
+    web = Flask(__name__)
+
+    @web.route("/metrics")
+    def scrape():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # No access log line per scrape
+    server = make_server(host, port, web)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
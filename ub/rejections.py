@@ -0,0 +1,216 @@
+import asyncio
+import json
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import aiofiles
+
+from .used_words import UsedWords
+from .word_index import WordIndex, DEFAULT_LANGUAGE
+
+
+class RejectionStore:
+    """
+    Words the game bot rejected, shared by every chat and kept in one JSON file.
+
+    Each entry counts rejections per chat. Confidence that a word is really
+    invalid grows with the number of distinct chats that saw it rejected
+    (1 - 0.5 ** chats), and a word at or above threshold is excluded in the
+    languages of the chats that rejected it: its ID is in
+    excluded_for(language), which callers merge into the used words of every
+    chat in that language so no selection engine offers it again. An admin
+    unban clears the exclusion until the word is rejected again.
+
+    Changes are written flush_delay seconds after the first unsaved one.
+    Several bot processes may share the file: a flush merges the entries on
+    disk (per-chat counts by maximum, since each chat is played by one
+    process) before replacing it, and after start() the file is merged
+    again every reload_interval seconds if another process has replaced it
+    since, so every process picks up the others' rejections even when it
+    has none of its own to write.
+    """
+
+    def __init__(self, path: str, threshold: float = 0.75, flush_delay: float = 5.0, reload_interval: float = 30.0,
+                 on_error: Optional[Callable[[Exception], Awaitable]] = None,
+                 on_change: Optional[Callable[[], None]] = None):
+        self.path = path
+        self.threshold = threshold
+        self.flush_delay = flush_delay
+        self.reload_interval = reload_interval
+        self.on_error = on_error
+        self.on_change = on_change  # Called whenever the set of excluded words changes
+        # word -> {chats: {chat_id: count}, languages, first, last, unbanned_at}
+        self.entries: Dict[str, dict] = {}
+        self._get_index: Optional[Callable[[str], WordIndex]] = None
+        self._excluded: Dict[str, UsedWords] = {}  # language -> IDs of excluded words, built on first use
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._mtime: Optional[int] = None  # Modification time of the file as we last read or wrote it
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def confidence(entry: dict) -> float:
+        return 1 - 0.5 ** len(entry["chats"])
+
+    def _is_excluded(self, entry: dict, language: Optional[str] = None) -> bool:
+        return (entry["last"] > entry["unbanned_at"] and self.confidence(entry) >= self.threshold
+                and (language is None or language in entry.get("languages", (DEFAULT_LANGUAGE,))))
+
+    def is_excluded(self, word: str, language: Optional[str] = None) -> bool:
+        """Whether word is excluded in language (in any language if None)."""
+        entry = self.entries.get(word.lower())
+        return entry is not None and self._is_excluded(entry, language)
+
+    def excluded_count(self) -> int:
+        # Also read by the metrics thread, hence the copy
+        return sum(1 for entry in list(self.entries.values()) if self._is_excluded(entry))
+
+    def bind(self, get_index: Callable[[str], WordIndex]):
+        """Map excluded words to IDs in get_index(language), the word index of each language."""
+        self._get_index = get_index
+        self._changed()
+
+    def excluded_for(self, language: str = DEFAULT_LANGUAGE) -> UsedWords:
+        """Word index IDs of the words excluded in language."""
+        excluded = self._excluded.get(language)
+        if excluded is None:
+            excluded = self._excluded[language] = UsedWords()
+            if self._get_index is not None:
+                index = self._get_index(language)
+                for word, entry in self.entries.items():
+                    if self._is_excluded(entry, language):
+                        word_id = index.id_of(word)
+                        if word_id is not None:
+                            excluded.add_id(word_id)
+        return excluded
+
+    def _changed(self):
+        self._excluded.clear()
+        if self.on_change is not None:
+            self.on_change()
+
+    def record(self, word: str, chat_id: int, language: str = DEFAULT_LANGUAGE) -> bool:
+        """Count a rejection of word in chat_id, played in language. Returns True if this newly excludes the word there."""
+        word = word.lower()
+        now = time.time()
+        entry = self.entries.get(word)
+        if entry is None:
+            entry = self.entries[word] = {"chats": {}, "languages": [], "first": now, "last": now, "unbanned_at": 0.0}
+        was_excluded = self._is_excluded(entry, language)
+        chat = str(chat_id)
+        entry["chats"][chat] = entry["chats"].get(chat, 0) + 1
+        languages = entry.setdefault("languages", [DEFAULT_LANGUAGE])
+        if language not in languages:
+            languages.append(language)
+        entry["last"] = now
+        self._schedule_flush()
+        if was_excluded or not self._is_excluded(entry, language):
+            return False
+        self._changed()
+        return True
+
+    def unban(self, word: str) -> bool:
+        """Allow word again until its next rejection. Returns False if it was not excluded."""
+        entry = self.entries.get(word.lower())
+        if entry is None or not self._is_excluded(entry):
+            return False
+        entry["unbanned_at"] = time.time()
+        self._changed()
+        self._schedule_flush()
+        return True
+
+    def most_recent(self, limit: int) -> List[tuple]:
+        """(word, entry) pairs, most recently rejected first."""
+        return sorted(self.entries.items(), key=lambda item: item[1]["last"], reverse=True)[:limit]
+
+    def _merge(self, entries: Dict[str, dict]) -> bool:
+        """Fold entries from the file into ours. Returns True if any exclusion changed."""
+        changed = False
+        for word, theirs in entries.items():
+            ours = self.entries.get(word)
+            if ours is None:
+                self.entries[word] = theirs
+                changed = changed or self._is_excluded(theirs)
+                continue
+            was_excluded = self._is_excluded(ours)
+            languages = ours.setdefault("languages", [DEFAULT_LANGUAGE])
+            for chat, count in theirs["chats"].items():
+                ours["chats"][chat] = max(ours["chats"].get(chat, 0), count)
+            for language in theirs.get("languages", (DEFAULT_LANGUAGE,)):
+                if language not in languages:
+                    languages.append(language)
+                    changed = changed or self._is_excluded(ours)
+            ours["first"] = min(ours["first"], theirs["first"])
+            ours["last"] = max(ours["last"], theirs["last"])
+            ours["unbanned_at"] = max(ours["unbanned_at"], theirs["unbanned_at"])
+            changed = changed or was_excluded != self._is_excluded(ours)
+        if changed:
+            self._changed()
+        return changed
+
+    def _file_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    async def _read(self) -> Dict[str, dict]:
+        self._mtime = self._file_mtime()
+        if self._mtime is None:
+            return {}
+        async with aiofiles.open(self.path, 'r') as f:
+            return json.loads(await f.read())
+
+    async def load(self) -> bool:
+        """Read the file. Returns True if any exclusion changed."""
+        return self._merge(await self._read())
+
+    def start(self):
+        """Start merging the file periodically."""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            await self.reload()
+
+    async def reload(self) -> bool:
+        """Merge the file if it changed since we last read or wrote it. Returns True if any exclusion changed."""
+        if self._file_mtime() == self._mtime:
+            return False
+        async with self._lock:
+            try:
+                return self._merge(await self._read())
+            except Exception as e:
+                if self.on_error is not None:
+                    await self.on_error(e)
+                return False
+
+    def _schedule_flush(self):
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.flush_delay, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_handle = None
+        asyncio.ensure_future(self.flush())
+
+    async def flush(self) -> bool:
+        """Merge the file into memory and write the result. Returns True if the file changed any exclusion."""
+        async with self._lock:
+            try:
+                changed = self._merge(await self._read())
+                tmp_path = f"{self.path}.{os.getpid()}.tmp"
+                async with aiofiles.open(tmp_path, 'w') as f:
+                    await f.write(json.dumps(self.entries))
+                os.replace(tmp_path, self.path)
+                self._mtime = self._file_mtime()
+                return changed
+            except Exception as e:
+                if self.on_error is not None:
+                    await self.on_error(e)
+                return False
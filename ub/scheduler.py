@@ -0,0 +1,162 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from pyrogram.errors import FloodWait
+
+# Send priorities, most urgent first
+PRIORITY_GAME = 0
+PRIORITY_ADMIN = 1
+PRIORITY_LOG = 2
+PRIORITY_NAMES = ("game", "admin", "log")  # Indexed by priority
+
+
+class TokenBucket:
+    """rate tokens per second, holding at most capacity."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _Outgoing:
+    __slots__ = ("chat_id", "text", "kwargs", "priority", "generation", "attempts", "future")
+
+    def __init__(self, chat_id: int, text: str, kwargs: Dict[str, Any], priority: int,
+                 generation: int, future: asyncio.Future):
+        self.chat_id = chat_id
+        self.text = text
+        self.kwargs = kwargs
+        self.priority = priority
+        self.generation = generation
+        self.attempts = 0
+        self.future = future
+
+
+class SendScheduler:
+    """
+    Central queue for every message the account sends.
+
+    Messages wait in one lane per priority (game words, then admin replies,
+    then logs) and go out when both the global bucket and the chat's bucket
+    have a token. A FloodWait on any send pauses all sends for the requested
+    time and puts the message back at the front of its lane. A game word
+    queued for an older prompt is dropped (resolved to None) once new_prompt()
+    is called for its chat.
+    """
+
+    def __init__(self, send: Callable[..., Awaitable], global_rate: float = 3.0, global_burst: float = 5,
+                 chat_rate: float = 0.5, chat_burst: float = 3, max_attempts: int = 3):
+        self.send_fn = send
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_attempts = max_attempts
+        self.backoff_until = 0.0  # Shared FloodWait pause, time.monotonic() based
+        self.flood_waits = 0  # FloodWaits seen since startup
+        self.flood_wait_seconds = 0.0  # Total wait those FloodWaits asked for
+        self.dropped = 0  # Stale game words dropped since startup
+        self._lanes: List[Deque[_Outgoing]] = [deque(), deque(), deque()]
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._generations: Dict[int, int] = {}  # chat_id -> prompt count
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def depth(self, priority: int) -> int:
+        return len(self._lanes[priority])
+
+    def new_prompt(self, chat_id: int):
+        """Mark game words queued so far for chat_id as stale."""
+        self._generations[chat_id] = self._generations.get(chat_id, 0) + 1
+
+    async def send(self, chat_id: int, text: str, priority: int = PRIORITY_ADMIN, **kwargs):
+        """Queue a message and wait until it is sent. Returns None if it was dropped as stale."""
+        future = asyncio.get_running_loop().create_future()
+        self._lanes[priority].append(_Outgoing(chat_id, text, kwargs, priority, self._generations.get(chat_id, 0), future))
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+        self._wakeup.set()
+        return await future
+
+    def _is_stale(self, item: _Outgoing) -> bool:
+        return item.priority == PRIORITY_GAME and item.generation != self._generations.get(item.chat_id, 0)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _next_ready(self, now: float) -> Tuple[Optional[_Outgoing], Optional[float]]:
+        """The next message that may go out now, or how long until one may."""
+        global_wait = self.global_bucket.wait_time(now)
+        earliest = None
+        for lane in self._lanes:
+            for item in list(lane):
+                if self._is_stale(item):
+                    lane.remove(item)
+                    self.dropped += 1
+                    if not item.future.done():
+                        item.future.set_result(None)
+                    continue
+                wait = max(global_wait, self._chat_bucket(item.chat_id).wait_time(now))
+                if wait <= 0:
+                    lane.remove(item)
+                    return item, None
+                earliest = wait if earliest is None else min(earliest, wait)
+        return None, earliest
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            wait = self.backoff_until - now
+            if wait <= 0:
+                item, wait = self._next_ready(now)
+                if item is not None:
+                    self.global_bucket.take(now)
+                    self._chat_bucket(item.chat_id).take(now)
+                    asyncio.ensure_future(self._deliver(item))
+                    continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, item: _Outgoing):
+        item.attempts += 1
+        try:
+            message = await self.send_fn(item.chat_id, item.text, **item.kwargs)
+        except FloodWait as e:
+            self.flood_waits += 1
+            self.flood_wait_seconds += e.value
+            self.backoff_until = max(self.backoff_until, time.monotonic() + e.value)
+            if item.attempts < self.max_attempts:
+                self._lanes[item.priority].appendleft(item)
+                self._wakeup.set()
+            elif not item.future.done():
+                item.future.set_exception(e)
+        except Exception as e:
+            if not item.future.done():
+                item.future.set_exception(e)
+        else:
+            if not item.future.done():
+                item.future.set_result(message)
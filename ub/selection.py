@@ -0,0 +1,236 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .word_index import WordIndex, DEFAULT_LANGUAGE, SOURCE_WORDFREQ, SOURCE_NLTK, dictionary_file, replaced_dictionary_file
+from .used_words import UsedBitset
+from .continuations import ContinuationTable
+from .lookahead import LookaheadEngine
+
+# Engines for this process, one set per game language, built on first use. The
+# pinned languages (those of enabled chats) are always kept, other languages only
+# while they are among the ENGINE_CACHE_SIZE most recently used; an evicted one is
+# mapped again from its dictionary file when a chat next needs it. In a process
+# pool every worker builds its own through init_worker.
+ENGINE_CACHE_SIZE = 3
+ENGINES: "OrderedDict[str, LanguageEngines]" = OrderedDict()
+PINNED_LANGUAGES: FrozenSet[str] = frozenset()
+INDEX_FINGERPRINTS: Dict[str, str] = {}  # language -> fingerprint of its index, kept after eviction
+_engines_lock = threading.Lock()
+
+
+class Selection(NamedTuple):
+    word_id: int
+    word: str  # Lowercase, as stored in the index
+    label: str  # Case and stage, for the log
+    frequency: Optional[float] = None  # wordfreq frequency, None for NLTK picks
+
+
+class LanguageEngines:
+    """The word index of one language and the Case 2/3 engines over it (built on first use)."""
+
+    __slots__ = ("index", "_table", "_lookahead")
+
+    def __init__(self, index: WordIndex):
+        self.index = index
+        self._table: Optional[ContinuationTable] = None
+        self._lookahead: Optional[LookaheadEngine] = None
+
+    @property
+    def table(self) -> ContinuationTable:
+        if self._table is None:
+            self._table = ContinuationTable(self.index)
+        return self._table
+
+    @property
+    def lookahead(self) -> LookaheadEngine:
+        if self._lookahead is None:
+            self._lookahead = LookaheadEngine(self.table)
+        return self._lookahead
+
+    def reset_overlays(self, chat_id: Optional[int] = None):
+        if self._table is not None:
+            if chat_id is None:
+                self._table.reset_all()
+            else:
+                self._table.reset(chat_id)
+
+
+# Function to map a language's index from its dictionary file, building and saving it first if missing
+def load_word_index(language: str = DEFAULT_LANGUAGE) -> WordIndex:
+    path = dictionary_file(language)
+    if not os.path.exists(path):
+        index = WordIndex.build(language)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            index.save(tmp_path)
+            os.replace(tmp_path, path)  # Processes starting together may race; any copy will do
+        except OSError:
+            return index  # Read-only directory: keep the built copy
+    return WordIndex.load(path)
+
+# Function to get the engines for a language (most recently used ENGINE_CACHE_SIZE kept)
+def get_engines(language: str = DEFAULT_LANGUAGE) -> LanguageEngines:
+    with _engines_lock:
+        engines = ENGINES.get(language)
+        if engines is not None:
+            ENGINES.move_to_end(language)
+            return engines
+    # Loaded outside the lock, so chats in other languages keep being served meanwhile
+    engines = LanguageEngines(load_word_index(language))
+    with _engines_lock:
+        engines = ENGINES.setdefault(language, engines)  # Another thread may have loaded it first
+        ENGINES.move_to_end(language)
+        while len(ENGINES) > ENGINE_CACHE_SIZE:
+            # Least recently used first; never a pinned language or the one just loaded
+            evicted = next((loaded for loaded in ENGINES if loaded not in PINNED_LANGUAGES and loaded != language), None)
+            if evicted is None:
+                break
+            del ENGINES[evicted]
+        INDEX_FINGERPRINTS[language] = engines.index.fingerprint
+    return engines
+
+# Function to set the languages that stay loaded whatever ENGINE_CACHE_SIZE says
+def pin_languages(languages: Iterable[str]):
+    global PINNED_LANGUAGES
+    PINNED_LANGUAGES = frozenset(languages)
+
+# Function to get the word index for a language
+def get_word_index(language: str = DEFAULT_LANGUAGE) -> WordIndex:
+    return get_engines(language).index
+
+# Function to map the index a language used before build_dictionary replaced it (None if it was not kept)
+def load_replaced_word_index(language: str, fingerprint: Optional[str]) -> Optional[WordIndex]:
+    path = replaced_dictionary_file(dictionary_file(language), fingerprint)
+    if not fingerprint or not os.path.exists(path):
+        return None
+    return WordIndex.load(path)
+
+# Function to get the Case 2 continuation table for a language
+def get_continuation_table(language: str = DEFAULT_LANGUAGE) -> ContinuationTable:
+    return get_engines(language).table
+
+# Function to get the Case 3 lookahead engine for a language
+def get_lookahead_engine(language: str = DEFAULT_LANGUAGE) -> LookaheadEngine:
+    return get_engines(language).lookahead
+
+# Function to drop the Case 2 overlays of chat_id (of every chat if None) in every loaded language
+def reset_overlays(chat_id: Optional[int] = None):
+    with _engines_lock:
+        engines = list(ENGINES.values())
+    for language_engines in engines:
+        language_engines.reset_overlays(chat_id)
+
+# Function to build all engines for the given languages up front (also the process pool initializer)
+def init_worker(languages: Iterable[str]):
+    languages = tuple(languages)
+    pin_languages(languages)  # A pool worker keeps them too
+    for language in languages:
+        get_lookahead_engine(language)
+
+# Function to time one stage of select_word
+@contextmanager
+def timed_stage(stages: Dict[str, float], stage: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages[stage] = stages.get(stage, 0.0) + time.perf_counter() - started
+
+# Function to pick a game word
+def select_word(start_letter: str, min_length: int, case: str, used: UsedBitset,
+                live: Optional[np.ndarray] = None, time_budget: float = 0.0,
+                language: str = DEFAULT_LANGUAGE) -> Tuple[Optional[Selection], Dict[str, float]]:
+    """
+    Pick a word starting with start_letter, at least min_length, not in used.
+    Case 1: Use wordfreq (highest frequency), then NLTK (alphabetical).
+    Case 2: Use wordfreq (fewest live replies left, then least frequent), then NLTK.
+    live is the chat's continuation overlay; it is recomputed from used if not given.
+    Case 3: Search ahead for up to time_budget seconds for the best ending letter,
+    then use the most frequent wordfreq word (or first NLTK word) with that ending.
+    used, live and the returned word IDs refer to the index of language.
+    Pure CPU work on picklable arguments, so it can run in a thread or process pool.
+    Returns the selection (None if no word fits) and the seconds spent in each
+    stage ("lookahead", "wordfreq", "nltk"), for the caller to record.
+    """
+    engines = get_engines(language)
+    index = engines.index
+    stages: Dict[str, float] = {}
+
+    # Case 3: Lookahead search over the word chain
+    if case == '3':
+        with timed_stage(stages, "lookahead"):
+            result = engines.lookahead.search(used, start_letter, min_length, time_budget)
+        if result is None:
+            return None, stages
+        end_letter, score, depth = result
+        label = f"Case 3, ends with {end_letter}, depth={depth}, score={score}"
+        with timed_stage(stages, "wordfreq"):
+            word_id = index.first_unused(SOURCE_WORDFREQ, start_letter, min_length, used, [end_letter])
+        if word_id is not None:
+            return Selection(word_id, index.words[word_id], label, index.frequencies[word_id]), stages
+        with timed_stage(stages, "nltk"):
+            word_id = index.first_unused(SOURCE_NLTK, start_letter, min_length, used, [end_letter])
+        return Selection(word_id, index.words[word_id], label + ", NLTK"), stages
+
+    # Step 1: Try wordfreq
+    with timed_stage(stages, "wordfreq"):
+        if case == '1':
+            # Case 1: Pick highest frequency word
+            word_id = index.first_unused(SOURCE_WORDFREQ, start_letter, min_length, used)
+            if word_id is not None:
+                return Selection(word_id, index.words[word_id], "Case 1", index.frequencies[word_id]), stages
+        elif case == '2':
+            # Case 2: Pick the word that leaves the opponent the fewest live replies
+            best = engines.table.best_move(used, SOURCE_WORDFREQ, start_letter, min_length, live)
+            if best is not None:
+                word_id, replies = best
+                word = index.words[word_id]
+                return Selection(word_id, word, f"Case 2, ends with {word[-1]}, {replies} replies left", index.frequencies[word_id]), stages
+
+    # Step 2: Fall back to NLTK
+    with timed_stage(stages, "nltk"):
+        if case == '1':
+            # Case 1: Pick first alphabetically
+            word_id = index.first_unused(SOURCE_NLTK, start_letter, min_length, used)
+            if word_id is not None:
+                return Selection(word_id, index.words[word_id], "Case 1, NLTK"), stages
+        elif case == '2':
+            # Case 2: Fewest live replies, then first alphabetically
+            best = engines.table.best_move(used, SOURCE_NLTK, start_letter, min_length, live)
+            if best is not None:
+                word_id, replies = best
+                word = index.words[word_id]
+                return Selection(word_id, word, f"Case 2, NLTK, ends with {word[-1]}, {replies} replies left"), stages
+
+    return None, stages
+
+# Function to pick several game words for one prompt, best first
+def select_ranked(start_letter: str, min_length: int, case: str, used: UsedBitset,
+                  live: Optional[np.ndarray] = None, time_budget: float = 0.0,
+                  count: int = 2, language: str = DEFAULT_LANGUAGE) -> Tuple[List[Selection], Dict[str, float]]:
+    """
+    The first count picks select_word would make for this prompt if each one
+    were rejected in turn, e.g. a move and its backup. Case 3 splits
+    time_budget between the picks. Returns the picks and the summed stage times.
+    """
+    used = used.copy()  # Picks are added to a copy
+    live = None if live is None else live.copy()
+    picks: List[Selection] = []
+    stages: Dict[str, float] = {}
+    for _ in range(count):
+        selection, pick_stages = select_word(start_letter, min_length, case, used, live, time_budget / count, language)
+        for stage, seconds in pick_stages.items():
+            stages[stage] = stages.get(stage, 0.0) + seconds
+        if selection is None:
+            break
+        picks.append(selection)
+        used.add_id(selection.word_id)
+        if live is not None:
+            get_continuation_table(language).discount(live, selection.word_id)
+    return picks, stages
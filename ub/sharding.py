@@ -0,0 +1,141 @@
+import hashlib
+from bisect import bisect
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from .journal import ConfigFile
+
+
+def _point(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hashing of chat IDs onto shards.
+
+    Every shard owns replicas points on a 64-bit ring and a chat belongs to
+    the shard owning the first point at or after the chat's hash. Adding a
+    shard only moves the chats that land on its new points (about 1/n of
+    them); every other chat keeps its account.
+    """
+
+    def __init__(self, shards: int, replicas: int = 64):
+        self.shards = shards
+        points: List[Tuple[int, int]] = sorted(
+            (_point(f"shard-{shard}-{replica}"), shard) for shard in range(shards) for replica in range(replicas)
+        )
+        self._hashes = [hash_ for hash_, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    def shard_for(self, chat_id: int) -> int:
+        if self.shards == 1:
+            return 0
+        position = bisect(self._hashes, _point(str(chat_id)))
+        return self._owners[position % len(self._owners)]
+
+
+class ShardCoordinator:
+    """
+    Which shard (account) plays which chat, and what this process does about it.
+
+    A process runs the shards in local (all of them by default) and plays
+    only the chats the ring assigns to those shards. Every process sees the
+    same admin commands in the log chat; each one applies a per-chat
+    command only if it owns the chat, so /on, /off and /clear reach the
+    right account without the processes talking to each other. The process
+    running shard 0 is the coordinator and answers everything that is not
+    about one chat (usage errors, bad chat IDs).
+
+    Each shard keeps its chats in its own config file, which every process
+    can read (see place_chats): /runs is answered by the coordinator from
+    all the shard files, and a chat the ring moves to another shard is
+    taken over, used words included, from its old shard's file. All
+    processes restart together with the same SESSION_STRINGS, so they
+    agree on the ring.
+    """
+
+    def __init__(self, shards: int, local: Optional[Iterable[int]] = None, replicas: int = 64):
+        self.ring = HashRing(shards, replicas)
+        self.local = sorted(set(range(shards) if local is None else local))
+        if not self.local or not all(0 <= shard < shards for shard in self.local):
+            raise ValueError(f"Local shards {self.local} not in 0..{shards - 1}")
+        self.lead = self.local[0]  # Local shard whose client handles admin commands
+        self._assigned: Dict[int, int] = {}  # chat_id -> shard, memoized
+
+    @property
+    def shards(self) -> int:
+        return self.ring.shards
+
+    @property
+    def is_coordinator(self) -> bool:
+        return 0 in self.local
+
+    @property
+    def runs_all(self) -> bool:
+        return len(self.local) == self.shards
+
+    def shard_for(self, chat_id: int) -> int:
+        shard = self._assigned.get(chat_id)
+        if shard is None:
+            shard = self._assigned[chat_id] = self.ring.shard_for(chat_id)
+        return shard
+
+    def owns(self, chat_id: int) -> bool:
+        """Whether this process plays chat_id."""
+        return self.runs_all or self.shard_for(chat_id) in self.local
+
+
+def place_chats(coordinator: ShardCoordinator, files: Mapping[str, ConfigFile],
+                own: Mapping[str, int]) -> Tuple[Dict[int, Tuple[int, dict, str]], Dict[int, Dict[int, dict]],
+                                                 Dict[int, Dict[int, float]]]:
+    """
+    Decide, at startup, which saved chat states this process plays and which it keeps for other shards.
+
+    files holds every config file in the working directory (the shard files,
+    plus any left over from older shard layouts); own maps this process's
+    files to their shard. A chat the ring gives to a local shard is played
+    from the most recently written file that has it, so a chat that moved
+    here is taken over from its old shard's file; once a local file has an
+    import marker for the chat, only local files count (it may have been
+    disabled since). A chat the ring gives to another process stays in its
+    local file, as a moved chat, until that process takes it over.
+
+    A record is stale, and skipped, when another file took the chat over
+    after this file was last written, or at all if the record is a moved
+    chat (its new owner has it). A marker is stale when another file took
+    the chat over later.
+
+    Returns (chats, moved, imported): chats maps each chat to play to
+    (shard, record, path it was read from); moved maps each local shard to
+    the records its file keeps for other shards; imported maps each local
+    shard to the markers it keeps, for the chats the ring gives it.
+    """
+    def taken_over_since(chat_id: int, path: str, since: float) -> bool:
+        return any(other != path and config.imported.get(chat_id, since) > since for other, config in files.items())
+
+    def stale(chat_id: int, path: str, record: dict) -> bool:
+        if record.get('moved'):
+            return any(other != path and chat_id in config.imported for other, config in files.items())
+        return taken_over_since(chat_id, path, files[path].written)
+
+    imported: Dict[int, Dict[int, float]] = {shard: {} for shard in coordinator.local}
+    for path in own:
+        for chat_id, at in (files[path].imported.items() if path in files else ()):
+            shard = coordinator.shard_for(chat_id)
+            if shard in coordinator.local and not taken_over_since(chat_id, path, at):
+                imported[shard][chat_id] = max(at, imported[shard].get(chat_id, at))
+    marked = {chat_id for markers in imported.values() for chat_id in markers}
+    chats: Dict[int, Tuple[int, dict, str]] = {}
+    moved: Dict[int, Dict[int, dict]] = {shard: {} for shard in coordinator.local}
+    for path, config in files.items():
+        for chat_id, record in config.chats.items():
+            if stale(chat_id, path, record):
+                continue
+            shard = coordinator.shard_for(chat_id)
+            if shard not in coordinator.local:
+                if path in own:
+                    moved[own[path]][chat_id] = record
+            elif (path in own or chat_id not in marked) and (
+                    chat_id not in chats or config.written > files[chats[chat_id][2]].written):
+                chats[chat_id] = (shard, record, path)
+    return chats, moved, imported
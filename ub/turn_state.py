@@ -0,0 +1,48 @@
+import asyncio
+from typing import Optional
+
+from .selection import Selection
+
+
+class TurnState:
+    """
+    The last prompt parsed in a chat and the backup word for it.
+
+    Rejection retries read start_letter and min_length from here instead of
+    fetching chat history. backup is the next candidate, picked in the
+    background while the first word is in flight, so a retry can be answered
+    without recomputing.
+    """
+
+    __slots__ = ("start_letter", "min_length", "backup")
+
+    def __init__(self, start_letter: str, min_length: int):
+        self.start_letter = start_letter
+        self.min_length = min_length
+        self.backup: Optional[Selection] = None
+
+
+class Speculation:
+    """
+    Our next move, worked out while the player before us is answering.
+
+    Created when a prompt names us as next player. Each word the current
+    player sends that fits their prompt (their_letter, min_length) gives our
+    likely start letter (its last letter); task then picks our move and its
+    backup for searched, the letter it was started for, assuming min_length
+    stays the same. Only one search runs per chat, so start_letter may be
+    ahead of searched until the running one finishes.
+    """
+
+    __slots__ = ("their_letter", "min_length", "start_letter", "searched", "task")
+
+    def __init__(self, their_letter: str, min_length: int):
+        self.their_letter = their_letter.lower()
+        self.min_length = min_length
+        self.start_letter: Optional[str] = None  # From their latest word
+        self.searched: Optional[str] = None
+        self.task: Optional[asyncio.Future] = None  # Resolves to [move, backup] selections for searched
+
+    def fits(self, word: str) -> bool:
+        """Whether word is a legal answer to the current player's prompt."""
+        return word[:1].lower() == self.their_letter and len(word) >= self.min_length
@@ -0,0 +1,217 @@
+import base64
+import sys
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, Optional, Union
+
+from .word_index import WordIndex
+
+CHUNK_BITS = 12  # Word IDs are grouped in chunks of 4096 by their high bits
+CHUNK_BYTES = (1 << CHUNK_BITS) // 8  # Size of a chunk's bitmap
+DENSE_AFTER = CHUNK_BYTES // 2  # IDs at which a chunk's sorted array('H') is as big as its bitmap
+
+
+def _uint32_bytes(values: Iterable[int]) -> bytes:
+    data = array('I', values)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data.tobytes()
+
+
+def _uint32_values(data: bytes) -> array:
+    values = array('I')
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class UsedBitset:
+    """
+    Dense copy of used words for the selection engines.
+
+    Bits in a bytearray indexed by word ID, so a numpy mask over the whole
+    index is one unpackbits call. Built per selection (see UsedWords.bitset())
+    and not kept: rare words have high IDs, so it is as long as the highest
+    ID in it.
+    """
+
+    __slots__ = ("bits", "extra")
+
+    def __init__(self, bits: bytes = b"", extra: Iterable[str] = ()):
+        self.bits = bytearray(bits)
+        self.extra = set(extra)
+
+    def has_id(self, word_id: int) -> bool:
+        byte = word_id >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] >> (word_id & 7) & 1)
+
+    def add_id(self, word_id: int):
+        byte = word_id >> 3
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        self.bits[byte] |= 1 << (word_id & 7)
+
+    def copy(self) -> "UsedBitset":
+        return UsedBitset(self.bits, self.extra)
+
+    def contains(self, word: str, index: WordIndex) -> bool:
+        word = word.lower()
+        word_id = index.id_of(word)
+        return word in self.extra if word_id is None else self.has_id(word_id)
+
+
+class UsedWords:
+    """
+    Words already used in one chat.
+
+    Dictionary words are kept by their word index ID in chunks of 4096 IDs.
+    A chunk holds the sorted low bits of its IDs in an array('H') until that
+    would outgrow a 512-byte bitmap, so a chat that plays a few rare words
+    (high IDs, e.g. Case 2 and 3 picks) stores about two bytes per word, and
+    one that plays many common words a bitmap over the first chunks. Words
+    the index does not know (e.g. rejected words that are not in the
+    dictionary) go in a small side set.
+    """
+
+    __slots__ = ("chunks", "extra")
+
+    def __init__(self, ids: Iterable[int] = (), extra: Iterable[str] = ()):
+        self.chunks: Dict[int, Union[array, bytearray]] = {}  # ID >> CHUNK_BITS -> sorted low bits or bitmap
+        self.extra = set(extra)
+        for word_id in ids:
+            self.add_id(word_id)
+
+    def __len__(self) -> int:
+        return sum(
+            sum(bin(byte).count("1") for byte in chunk) if isinstance(chunk, bytearray) else len(chunk)
+            for chunk in list(self.chunks.values())  # Also read by the metrics thread
+        ) + len(self.extra)
+
+    def nbytes(self) -> int:
+        """Bytes held by the ID chunks (not counting object overhead or extra)."""
+        return sum(len(chunk) if isinstance(chunk, bytearray) else chunk.itemsize * len(chunk)
+                   for chunk in list(self.chunks.values()))
+
+    def has_id(self, word_id: int) -> bool:
+        chunk = self.chunks.get(word_id >> CHUNK_BITS)
+        if chunk is None:
+            return False
+        low = word_id & ((1 << CHUNK_BITS) - 1)
+        if isinstance(chunk, bytearray):
+            return bool(chunk[low >> 3] >> (low & 7) & 1)
+        position = bisect_left(chunk, low)
+        return position < len(chunk) and chunk[position] == low
+
+    def add_id(self, word_id: int):
+        key = word_id >> CHUNK_BITS
+        low = word_id & ((1 << CHUNK_BITS) - 1)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            self.chunks[key] = array('H', [low])
+        elif isinstance(chunk, bytearray):
+            chunk[low >> 3] |= 1 << (low & 7)
+        else:
+            position = bisect_left(chunk, low)
+            if position < len(chunk) and chunk[position] == low:
+                return
+            chunk.insert(position, low)
+            if len(chunk) >= DENSE_AFTER:
+                bitmap = bytearray(CHUNK_BYTES)
+                for chunk_low in chunk:
+                    bitmap[chunk_low >> 3] |= 1 << (chunk_low & 7)
+                self.chunks[key] = bitmap
+
+    def ids(self) -> Iterator[int]:
+        """Word IDs in ascending order."""
+        for key in sorted(self.chunks):
+            chunk = self.chunks[key]
+            base = key << CHUNK_BITS
+            if isinstance(chunk, bytearray):
+                for byte_index, byte in enumerate(chunk):
+                    if byte:
+                        for bit in range(8):
+                            if byte >> bit & 1:
+                                yield base | byte_index << 3 | bit
+            else:
+                for low in chunk:
+                    yield base | low
+
+    def bitset(self, *others: "UsedWords") -> UsedBitset:
+        """Dense copy of these words and others', for the selection engines."""
+        dense = UsedBitset()
+        bits = dense.bits
+        for used in (self,) + others:
+            for key, chunk in used.chunks.items():
+                base = key << CHUNK_BITS
+                if isinstance(chunk, bytearray):
+                    start = base >> 3
+                    if len(bits) < start + CHUNK_BYTES:
+                        bits.extend(bytes(start + CHUNK_BYTES - len(bits)))
+                    merged = int.from_bytes(bits[start:start + CHUNK_BYTES], "little") | int.from_bytes(chunk, "little")
+                    bits[start:start + CHUNK_BYTES] = merged.to_bytes(CHUNK_BYTES, "little")
+                else:
+                    for low in chunk:
+                        dense.add_id(base | low)
+            dense.extra |= used.extra
+        return dense
+
+    def contains(self, word: str, index: WordIndex) -> bool:
+        word = word.lower()
+        word_id = index.id_of(word)
+        return word in self.extra if word_id is None else self.has_id(word_id)
+
+    def add(self, word: str, index: WordIndex):
+        word = word.lower()
+        word_id = index.id_of(word)
+        if word_id is None:
+            self.extra.add(word)
+        else:
+            self.add_id(word_id)
+
+    def to_dict(self) -> Dict[str, Union[str, list, dict]]:
+        """IDs of sparse chunks as base64 little-endian uint32s, dense chunks as base64 bitmaps."""
+        sparse = [word_id for key in sorted(self.chunks) if not isinstance(self.chunks[key], bytearray)
+                  for word_id in ((key << CHUNK_BITS) | low for low in self.chunks[key])]
+        return {
+            "ids": base64.b64encode(_uint32_bytes(sparse)).decode("ascii"),
+            "bitmaps": {
+                str(key): base64.b64encode(bytes(chunk)).decode("ascii")
+                for key, chunk in sorted(self.chunks.items()) if isinstance(chunk, bytearray)
+            },
+            "extra": sorted(self.extra),
+        }
+
+    @classmethod
+    def _from_saved(cls, data: dict) -> "UsedWords":
+        used = cls(_uint32_values(base64.b64decode(data.get("ids", ""))), data.get("extra", ()))
+        for key, bitmap in data.get("bitmaps", {}).items():
+            used.chunks[int(key)] = bytearray(base64.b64decode(bitmap))
+        # One dense bitset over all IDs, as saved before chunks
+        for byte_index, byte in enumerate(base64.b64decode(data.get("bits", ""))):
+            for bit in range(8):
+                if byte >> bit & 1:
+                    used.add_id(byte_index << 3 | bit)
+        return used
+
+    @classmethod
+    def from_dict(cls, data: Union[dict, list], index: WordIndex, fingerprint: Optional[str] = None,
+                  previous: Optional[WordIndex] = None) -> "UsedWords":
+        """
+        Restore from to_dict() output, or from the old plain list of words.
+        IDs saved against a different dictionary (fingerprint mismatch) are mapped back to words through
+        previous, the index they were saved against; without it they are dropped.
+        """
+        if isinstance(data, list):
+            used = cls()
+            for word in data:
+                used.add(word, index)
+            return used
+        saved = cls._from_saved(data)
+        if fingerprint == index.fingerprint:
+            return saved
+        used = cls((), saved.extra)
+        if previous is not None and previous.fingerprint == fingerprint:
+            for word_id in saved.ids():
+                used.add(previous.words[word_id], index)
+        return used
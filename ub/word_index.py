@@ -0,0 +1,347 @@
+import os
+import re
+import sys
+import json
+import logging
+import mmap
+import zlib
+import heapq
+import struct
+import unicodedata
+from array import array
+from collections import Counter
+from collections.abc import Sequence as SequenceABC
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Sources the index is built from
+SOURCE_WORDFREQ = "wordfreq"
+SOURCE_NLTK = "nltk"
+SOURCES = (SOURCE_WORDFREQ, SOURCE_NLTK)
+
+WORDFREQ_SIZE = 321180  # Number of wordfreq words considered for selection
+LETTER_FREQUENCY_SIZE = 300000  # Number of wordfreq words counted for letter frequency
+
+# Game language (wordfreq language code). NLTK's words corpus only covers English.
+DEFAULT_LANGUAGE = "en"
+NLTK_LANGUAGES = frozenset(("en",))
+# Letters a word may consist of, per language. Other languages take Unicode letters,
+# with the combining marks that follow them (see is_word), of the scripts their most
+# frequent words are written in (see language_scripts).
+LETTER_CLASSES = {"en": "a-zA-Z"}
+# Vowel signs, viramas and combining accents: neither \w nor str.isalpha() counts them as letters
+MARK_CATEGORIES = frozenset(("Mn", "Mc", "Me"))
+SCRIPT_SAMPLE_SIZE = 1000  # Most frequent wordfreq words that decide a language's scripts
+SCRIPT_MIN_SHARE = 0.05  # Share of the sampled letters a script needs to belong to the language
+
+# Prebuilt artifact (see ub/build_dictionary.py)
+DICTIONARY_FILE = "dictionary.bin"
+DICTIONARY_MAGIC = b"UBDICT01"
+
+
+# Function to check that text is one word: a letter, then letters and combining marks (Hindi "में" is a letter and two marks)
+def is_word(text: str) -> bool:
+    return text[:1].isalpha() and all(ch.isalpha() or unicodedata.category(ch) in MARK_CATEGORIES for ch in text)
+
+# Function to get the check for a whole word in a language
+@lru_cache(maxsize=None)
+def word_check(language: str) -> Callable[[str], bool]:
+    letters = LETTER_CLASSES.get(language)
+    if not letters:
+        return is_word
+    pattern = re.compile(f"^[{letters}]+$")
+    return lambda word: pattern.match(word) is not None
+
+# Function to get the script of a letter (first word of its Unicode name: LATIN, CYRILLIC, CJK, HIRAGANA, ...)
+def letter_script(letter: str) -> str:
+    return unicodedata.name(letter, "").split(" ", 1)[0]
+
+# Function to get the scripts a word list is written in, ignoring stray loanwords and symbols
+def language_scripts(words: Iterable[str]) -> FrozenSet[str]:
+    counts = Counter(letter_script(letter) for word in words for letter in word if letter.isalpha())
+    total = sum(counts.values())
+    return frozenset(script for script, count in counts.items() if count >= total * SCRIPT_MIN_SHARE)
+
+# Function to get the prebuilt index file for a language
+def dictionary_file(language: str = DEFAULT_LANGUAGE) -> str:
+    return DICTIONARY_FILE if language == DEFAULT_LANGUAGE else f"dictionary.{language}.bin"
+
+# Function to get where a replaced index file is kept, so bitsets saved against it can still be mapped back to words
+def replaced_dictionary_file(path: str, fingerprint: str) -> str:
+    return f"{path}.{fingerprint}"
+
+# Function to check that wordfreq has a word list for a language
+def is_supported_language(language: str) -> bool:
+    if os.path.exists(dictionary_file(language)):
+        return True
+    import wordfreq
+    return language in wordfreq.available_languages()
+
+
+def ensure_nltk_words():
+    # Download NLTK words corpus if not already present
+    import nltk
+    try:
+        nltk.data.find('corpora/words')
+    except LookupError:
+        try:
+            nltk.download('words')
+        except Exception as e:
+            print(f"Failed to download NLTK words corpus: {e}")
+
+# Function to get the NLTK words corpus, or no words if it is missing and could not be downloaded
+def nltk_words() -> List[str]:
+    from nltk.corpus import words
+    ensure_nltk_words()
+    try:
+        return words.words()
+    except LookupError as e:
+        logger.warning(f"NLTK words corpus unavailable, building the index from wordfreq alone: {e}")
+        return []
+
+
+class WordList(SequenceABC):
+    """Read-only list of words decoded on demand from a newline-joined UTF-8 blob."""
+
+    def __init__(self, blob: memoryview, offsets: memoryview):
+        self.blob = blob
+        self.offsets = offsets  # n + 1 byte offsets into blob
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, word_id):
+        if isinstance(word_id, slice):
+            return [self[i] for i in range(*word_id.indices(len(self)))]
+        return bytes(self.blob[self.offsets[word_id]:self.offsets[word_id + 1] - 1]).decode()
+
+
+class WordIndex:
+    """
+    Prebuilt lookup tables over the wordfreq and NLTK vocabularies of one language.
+
+    Every distinct lowercase word gets an integer ID, assigned in wordfreq rank
+    order followed by NLTK-only words. For each source, words are grouped by
+    first letter in selection order (highest frequency first for wordfreq,
+    alphabetical for NLTK), and each letter group is split into length buckets
+    so a query only walks words that are long enough. Languages other than
+    English have wordfreq words only, written in the scripts of their most
+    frequent words.
+
+    build() computes all of this from the corpora; save() writes it to a
+    single binary file that load() maps into memory without parsing, so a
+    loaded index needs neither wordfreq nor NLTK.
+    """
+
+    def __init__(self, language: str = DEFAULT_LANGUAGE):
+        self.language = language
+        self.words: Sequence[str] = []  # word ID -> lowercase word
+        self.frequencies = array('d')  # word ID -> wordfreq frequency (0.0 for NLTK-only words)
+        self.word_lengths = array('H')  # word ID -> length in characters
+        self.first_codes = array('I')  # word ID -> code point of first letter
+        self.last_codes = array('I')  # word ID -> code point of last letter
+        self.ids: Optional[Dict[str, int]] = {}  # lowercase word -> word ID (built indexes only)
+        self.sorted_ids = array('I')  # word IDs in word order, for id_of() on loaded indexes
+        self.fingerprint = ""  # Identifies the word ID assignment, for persisted bitsets
+        self.letter_counts: Dict[str, int] = {}  # first letter -> wordfreq words starting with it
+        # source -> letter -> word IDs in selection order
+        self._entries: Dict[str, Dict[str, Sequence[int]]] = {source: {} for source in SOURCES}
+        # source -> letter -> length -> positions into _entries (ascending)
+        self._buckets: Dict[str, Dict[str, Dict[int, Sequence[int]]]] = {source: {} for source in SOURCES}
+        self._mmap: Optional[mmap.mmap] = None
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    @classmethod
+    def build(cls, language: str = DEFAULT_LANGUAGE) -> "WordIndex":
+        # Imported here so that loading a prebuilt index never touches the corpora
+        import wordfreq
+        index = cls(language)
+        is_language_word = word_check(language)
+        if language == DEFAULT_LANGUAGE:
+            index.letter_counts = {chr(i): 0 for i in range(ord('a'), ord('z') + 1)}
+        top_words = wordfreq.top_n_list(language, WORDFREQ_SIZE)
+        # Without a letter class, keep to the language's own scripts (no Cyrillic or CJK entries in German)
+        scripts = None if language in LETTER_CLASSES else language_scripts(top_words[:SCRIPT_SAMPLE_SIZE])
+
+        # wordfreq: alphabetic words, highest frequency first (stable on list order)
+        grouped: Dict[str, List[int]] = {}
+        for rank, word in enumerate(top_words):
+            if not word or not is_language_word(word):
+                continue
+            # Marks belong to the script of the letter they follow
+            if scripts is not None and not all(letter_script(letter) in scripts for letter in word if letter.isalpha()):
+                continue
+            word = word.lower()
+            if rank < LETTER_FREQUENCY_SIZE:
+                index.letter_counts[word[0]] = index.letter_counts.get(word[0], 0) + 1
+            word_id = index._add_word(word, wordfreq.word_frequency(word, language))
+            grouped.setdefault(word[0], []).append(word_id)
+        for letter, word_ids in grouped.items():
+            word_ids.sort(key=lambda word_id: index.frequencies[word_id], reverse=True)
+            index._add_group(SOURCE_WORDFREQ, letter, word_ids)
+
+        # NLTK: alphabetic words in case-sensitive alphabetical order
+        if language in NLTK_LANGUAGES:
+            grouped = {}
+            for word in sorted(set(nltk_words())):
+                if not word or not is_language_word(word):
+                    continue
+                grouped.setdefault(word[0].lower(), []).append(index._add_word(word.lower(), 0.0))
+            for letter, word_ids in grouped.items():
+                index._add_group(SOURCE_NLTK, letter, word_ids)
+
+        index.sorted_ids = array('I', sorted(range(len(index.words)), key=index.words.__getitem__))
+        index.fingerprint = format(zlib.crc32("\n".join(index.words).encode()), "08x")
+        return index
+
+    def _add_word(self, word: str, frequency: float) -> int:
+        word_id = self.ids.get(word)
+        if word_id is None:
+            word_id = len(self.words)
+            self.ids[word] = word_id
+            self.words.append(word)
+            self.frequencies.append(frequency)
+            self.word_lengths.append(len(word))
+            self.first_codes.append(ord(word[0]))
+            self.last_codes.append(ord(word[-1]))
+        return word_id
+
+    def _add_group(self, source: str, letter: str, word_ids: List[int]):
+        buckets: Dict[int, array] = {}
+        for position, word_id in enumerate(word_ids):
+            buckets.setdefault(self.word_lengths[word_id], array('I')).append(position)
+        self._entries[source][letter] = array('I', word_ids)
+        self._buckets[source][letter] = buckets
+
+    def save(self, path: str):
+        """Write the index as a single file for load()."""
+        sections = [("blob", "B", "".join(word + "\n" for word in self.words).encode())]
+        offsets = array('I', [0])
+        for word in self.words:
+            offsets.append(offsets[-1] + len(word.encode()) + 1)
+        sections += [
+            ("offsets", "I", offsets.tobytes()),
+            ("frequencies", "d", array('d', self.frequencies).tobytes()),
+            ("word_lengths", "H", array('H', self.word_lengths).tobytes()),
+            ("first_codes", "I", array('I', self.first_codes).tobytes()),
+            ("last_codes", "I", array('I', self.last_codes).tobytes()),
+            ("sorted_ids", "I", array('I', self.sorted_ids).tobytes()),
+        ]
+        letters: Dict[str, Dict[str, list]] = {}
+        buckets: Dict[str, Dict[str, Dict[str, list]]] = {}
+        for source in SOURCES:
+            entries, positions = array('I'), array('I')
+            letters[source], buckets[source] = {}, {}
+            for letter in sorted(self._entries[source]):
+                letters[source][letter] = [len(entries), len(entries) + len(self._entries[source][letter])]
+                entries.extend(self._entries[source][letter])
+                buckets[source][letter] = {}
+                for length, bucket in sorted(self._buckets[source][letter].items()):
+                    buckets[source][letter][str(length)] = [len(positions), len(positions) + len(bucket)]
+                    positions.extend(bucket)
+            sections += [("entries:" + source, "I", entries.tobytes()), ("buckets:" + source, "I", positions.tobytes())]
+
+        layout = {}
+        position = 0
+        for name, typecode, data in sections:
+            layout[name] = [position, len(data), typecode]
+            position += -(-len(data) // 8) * 8  # Keep every section 8-byte aligned
+        meta = json.dumps({
+            "byteorder": sys.byteorder,
+            "language": self.language,
+            "fingerprint": self.fingerprint,
+            "letter_counts": self.letter_counts,
+            "sections": layout,
+            "letters": letters,
+            "buckets": buckets,
+        }).encode()
+        header = DICTIONARY_MAGIC + struct.pack("<Q", len(meta)) + meta
+        header += bytes(-len(header) % 8)
+        with open(path, "wb") as f:
+            f.write(header)
+            for name, typecode, data in sections:
+                f.write(data + bytes(-len(data) % 8))
+
+    @classmethod
+    def load(cls, path: str) -> "WordIndex":
+        """Map a file written by save() into memory. Arrays are views into the mapping."""
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        if bytes(view[:8]) != DICTIONARY_MAGIC:
+            raise ValueError(f"{path} is not a word index file")
+        (meta_length,) = struct.unpack_from("<Q", view, 8)
+        meta = json.loads(bytes(view[16:16 + meta_length]))
+        if meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was built on a {meta['byteorder']}-endian machine")
+        data_start = 16 + meta_length + (-(16 + meta_length) % 8)
+
+        def section(name):
+            offset, length, typecode = meta["sections"][name]
+            return view[data_start + offset:data_start + offset + length].cast(typecode)
+
+        index = cls(meta.get("language", DEFAULT_LANGUAGE))
+        index._mmap = mapped
+        index.words = WordList(section("blob"), section("offsets"))
+        index.frequencies = section("frequencies")
+        index.word_lengths = section("word_lengths")
+        index.first_codes = section("first_codes")
+        index.last_codes = section("last_codes")
+        index.sorted_ids = section("sorted_ids")
+        index.ids = None
+        index.fingerprint = meta["fingerprint"]
+        index.letter_counts = meta["letter_counts"]
+        for source in SOURCES:
+            entries = section("entries:" + source)
+            positions = section("buckets:" + source)
+            for letter, (start, end) in meta["letters"][source].items():
+                index._entries[source][letter] = entries[start:end]
+                index._buckets[source][letter] = {
+                    int(length): positions[bucket_start:bucket_end]
+                    for length, (bucket_start, bucket_end) in meta["buckets"][source][letter].items()
+                }
+        return index
+
+    def id_of(self, word: str) -> Optional[int]:
+        """ID of a lowercase word, or None if it is not in the index."""
+        if self.ids is not None:
+            return self.ids.get(word)
+        words = self.words
+        sorted_ids = self.sorted_ids
+        low, high = 0, len(sorted_ids)
+        while low < high:
+            middle = (low + high) // 2
+            if words[sorted_ids[middle]] < word:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(sorted_ids) and words[sorted_ids[low]] == word:
+            return sorted_ids[low]
+        return None
+
+    def entries(self, source: str, letter: str) -> Optional[Sequence[int]]:
+        """IDs of all words from source starting with letter, in selection order."""
+        return self._entries[source].get(letter.lower())
+
+    def candidates(self, source: str, letter: str, min_length: int) -> Iterator[int]:
+        """Yield IDs of words starting with letter and at least min_length long, in selection order."""
+        letter = letter.lower()
+        entries = self._entries[source].get(letter)
+        if not entries:
+            return iter(())
+        buckets = [positions for length, positions in self._buckets[source][letter].items() if length >= min_length]
+        return (entries[position] for position in heapq.merge(*buckets))
+
+    def first_unused(self, source: str, letter: str, min_length: int, used,
+                     endings: Optional[Iterable[str]] = None) -> Optional[int]:
+        """First word in selection order that is not used and, if given, ends with one of endings."""
+        ending_codes = None if endings is None else {ord(ending) for ending in endings}
+        for word_id in self.candidates(source, letter, min_length):
+            if used.has_id(word_id) or (ending_codes is not None and self.last_codes[word_id] not in ending_codes):
+                continue
+            return word_id
+        return None